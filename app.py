@@ -1,183 +1,272 @@
 import os
-import glob
 import sys
-import json
-from flask import Flask, render_template, send_from_directory, request
+import time
+import hmac
+import threading
+from flask import Flask, render_template, send_from_directory, request, Response, jsonify, abort, g
+from werkzeug.http import is_resource_modified
 from datetime import datetime
 
-# Configure path for imports - we'll lazy load modules when needed
+# Configure path for imports - pandas, NumPy and matplotlib are only loaded
+# when a data snapshot has to be analysed or a chart rendered
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
-# Lazy load expensive imports only when needed
-pandas_loaded = False
-analyzer_loaded = False
-
-def load_pandas():
-    global pandas_loaded, pd
-    if not pandas_loaded:
-        import pandas as pd
-        pandas_loaded = True
-    return pd
-
-def load_analyzer():
-    global analyzer_loaded, get_detailed_stats
-    if not analyzer_loaded:
-        from src.analyzer import get_detailed_stats
-        analyzer_loaded = True
-    return get_detailed_stats
+from src.stats_cache import get_summary_stats, get_range_summary_stats, get_series_payload, series_etag, cache_key
+from src.trackers import tracker_paths, is_valid_tracker_id, find_latest_data as find_tracker_data, \
+    find_latest_visuals as find_tracker_visuals, visual_version
+from src.manifest import manifest_path
+from src.http_cache import page_etag, get_page, store_page, choose_encoding, IMMUTABLE_MAX_AGE
+from src import instrumentation
+from src.instrumentation import span, count_cache
 
 # Check if we're running in demo mode for portfolio display
 # (when no Google Sheets credentials are available)
 DEMO_MODE = os.environ.get('DEMO_MODE', 'False').lower() == 'true'
 
+# Draw the charts in the browser from /api/series instead of serving
+# matplotlib PNGs; can also be picked per request with ?charts=client|image
+CLIENT_CHARTS = os.environ.get('CLIENT_CHARTS', 'False').lower() == 'true'
+
 app = Flask(__name__)
 
-# Configure paths
+# Configure paths - the default tracker lives directly in output/, other
+# trackers in output/trackers/<tracker_id>/ and are served under /u/<tracker_id>/
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 OUTPUT_DIR = os.path.join(BASE_DIR, 'output')
-DATA_DIR = os.path.join(OUTPUT_DIR, 'data')
-VISUALS_DIR = os.path.join(OUTPUT_DIR, 'visuals')
+DEFAULT_PATHS = tracker_paths(OUTPUT_DIR)
+DATA_DIR = DEFAULT_PATHS.data_dir
+VISUALS_DIR = DEFAULT_PATHS.visuals_dir
+STORE_DIR = DEFAULT_PATHS.store_dir
+RENDER_CACHE_DIR = DEFAULT_PATHS.render_cache_dir
+PROFILE_DIR = os.path.join(OUTPUT_DIR, 'profiles')
+
+# Background refresh: set REFRESH_SOURCE to a CSV export of the sheet or to
+# 'sheets' (REFRESH_SHEET names the spreadsheet; '{tracker}' in either is
+# replaced by the tracker id) and the app regenerates snapshots older than
+# REFRESH_INTERVAL seconds off the request path, serving the stale one
+# meanwhile. POST /api/refresh queues a refresh on demand; it requires
+# 'Authorization: Bearer <REFRESH_TOKEN>' when REFRESH_TOKEN is set.
+REFRESH_SOURCE = os.environ.get('REFRESH_SOURCE')
+REFRESH_TOKEN = os.environ.get('REFRESH_TOKEN')
+refresher = None
+if REFRESH_SOURCE:
+    from src.refresh import RefreshWorker
+    refresher = RefreshWorker(OUTPUT_DIR, REFRESH_SOURCE,
+                              interval=float(os.environ.get('REFRESH_INTERVAL') or 3600),
+                              sheet=os.environ.get('REFRESH_SHEET', "Habit Tracker"))
+
+# Opt-in timing spans, Server-Timing headers, /metrics and slow request
+# profiles (INSTRUMENTATION=true, PROFILE_SLOW_REQUESTS=<seconds>)
+if instrumentation.ENABLED:
+    @app.before_request
+    def start_instrumentation():
+        g.spans_token = instrumentation.begin_request()
+        g.request_start = time.perf_counter()
+        g.sampler = None
+        if instrumentation.PROFILE_SLOW_REQUESTS:
+            g.sampler = instrumentation.StackSampler(threading.get_ident()).start()
+    
+    @app.after_request
+    def finish_instrumentation(response):
+        if 'spans_token' not in g:
+            return response
+        total = time.perf_counter() - g.request_start
+        spans = instrumentation.end_request(g.pop('spans_token'))
+        instrumentation.REQUEST_SECONDS.observe((request.endpoint or 'unmatched',), total)
+        response.headers['Server-Timing'] = instrumentation.server_timing(spans, total)
+        
+        if g.sampler is not None:
+            samples = g.sampler.stop()
+            if total >= instrumentation.PROFILE_SLOW_REQUESTS:
+                path = instrumentation.dump_profile(samples, PROFILE_DIR, f'{request.endpoint}-{total * 1000:.0f}ms')
+                print(f"Slow request {request.path} took {total:.3f}s, profile written to {path}")
+        return response
 
-@app.route('/')
-def index():
+def get_tracker_paths(tracker_id):
+    """Directories of ``tracker_id`` (None for the default tracker), or a 404 if it doesn't exist"""
+    if tracker_id is None:
+        return DEFAULT_PATHS
+    if not is_valid_tracker_id(tracker_id):
+        abort(404)
+    paths = tracker_paths(OUTPUT_DIR, tracker_id)
+    if not os.path.isdir(paths.data_dir):
+        abort(404)
+    return paths
+
+def get_date_range():
+    """The inclusive ?from=YYYY-MM-DD&to=YYYY-MM-DD dates of the request (None when absent), or a 400"""
+    dates = []
+    for name in ('from', 'to'):
+        value = request.args.get(name)
+        try:
+            dates.append(datetime.strptime(value, '%Y-%m-%d').date() if value else None)
+        except ValueError:
+            abort(400, f"'{name}' must be a date in YYYY-MM-DD format")
+    return tuple(dates)
+
+def snapshot_modified(paths, snapshot):
+    """When the page's snapshot last changed: its data or, if newer, the manifest listing its charts"""
+    mtimes = [snapshot[1]] if snapshot else []
+    try:
+        mtimes.append(os.stat(manifest_path(paths)).st_mtime_ns)
+    except OSError:
+        pass
+    return datetime.fromtimestamp(max(mtimes) / 1e9).astimezone() if mtimes else None
+
+def send_variants(variants, etag, mimetype, last_modified=None):
+    """Send the best encoding of ``variants`` the client accepts, or a 304 when ``variants`` is None"""
+    if variants is None:
+        response = Response(status=304)
+    else:
+        encoding = choose_encoding(request.accept_encodings, variants)
+        response = Response(variants[encoding], mimetype=mimetype)
+        if encoding != 'identity':
+            response.headers['Content-Encoding'] = encoding
+    response.set_etag(etag)
+    if last_modified is not None:
+        response.last_modified = last_modified
+    response.headers['Vary'] = 'Accept-Encoding'
+    response.headers['Cache-Control'] = 'no-cache'  # Always revalidate; the ETag makes that cheap
+    return response
+
+@app.route('/', defaults={'tracker_id': None})
+@app.route('/u/<tracker_id>/')
+def index(tracker_id):
     """Main page that displays habit tracking dashboard"""
-    # Get list of available visualizations
-    visual_files = glob.glob(os.path.join(VISUALS_DIR, '*.png'))
+    paths = get_tracker_paths(tracker_id)
+    date_from, date_to = get_date_range()
+    range_args = {name: str(date) for name, date in (('from', date_from), ('to', date_to)) if date}
+    # Normalised so every spelling of the same mode shares one ETag and cached page
+    chart_mode = request.args.get('charts')
+    if chart_mode not in ('client', 'image'):
+        chart_mode = 'client' if CLIENT_CHARTS else 'image'
+    client_charts = chart_mode == 'client'
     
-    # Group files by type (remove date from filename to group them)
-    visual_types = {}
-    for file_path in visual_files:
-        base_name = os.path.basename(file_path)
-        # Split by date pattern (assumes format like 'habit_completion_2025-05-08.png')
-        file_parts = base_name.split('_')
-        if len(file_parts) > 1:
-            # Get everything before the date to use as type key
-            file_type = '_'.join(file_parts[:-1])  # e.g., 'habit_completion'
-            # Add to dictionary with creation time as value for sorting
-            if file_type not in visual_types:
-                visual_types[file_type] = []
-            visual_types[file_type].append({
-                'path': file_path,
-                'name': base_name,
-                'time': os.path.getmtime(file_path)
-            })
+    # Stale-while-revalidate: serve the current snapshot, refresh it in the background
+    if refresher is not None:
+        refresher.refresh_if_stale(tracker_id, paths)
     
-    # For each type, only keep the most recent file
-    latest_visuals = []
-    for file_type, files in visual_types.items():
-        # Sort by modification time, newest first
-        sorted_files = sorted(files, key=lambda x: x['time'], reverse=True)
-        if sorted_files:
-            latest_visuals.append(sorted_files[0]['name'])
+    # Latest chart of each type, from the tracker's manifest (not needed when
+    # the browser draws the charts), with the content hash that goes in its URL
+    with span('list_visuals'):
+        visual_files = [] if client_charts else find_tracker_visuals(paths)
+        visual_versions = {name: visual_version(paths, name) for name in visual_files}
     
-    # Final list of visualization files to display
-    visual_files = latest_visuals
+    # Get the latest data for summary statistics
+    with span('find_data'):
+        latest_data, latest_date = find_tracker_data(paths)
+        snapshot = cache_key(latest_data) if latest_data else None
     
-    # Get the latest data file for summary statistics
-    data_files = glob.glob(os.path.join(DATA_DIR, '*.csv'))
-    latest_data = None
-    latest_date = None
-    summary_stats = None
+    # The page only changes with its snapshot, so a client that has it gets a
+    # 304 before any statistics are loaded
+    etag = page_etag(tracker_id, snapshot, latest_date, visual_versions, chart_mode, range_args)
+    last_modified = snapshot_modified(paths, snapshot)
+    if not is_resource_modified(request.environ, etag=etag, last_modified=last_modified):
+        return send_variants(None, etag, 'text/html', last_modified)
     
-    if data_files:
-        # Find the most recent data file
-        latest_data = max(data_files, key=os.path.getmtime)
-        # Get the modification date
-        latest_date = datetime.fromtimestamp(os.path.getmtime(latest_data)).strftime('%B %d, %Y')
-        # Load data for summary stats - lazy load pandas
-        pd = load_pandas()
-        df = pd.read_csv(latest_data)
-        
-        # Basic statistics
-        total_habits = len(df.columns) - 1  # Subtract date column
-        # Convert YYYY-MM-DD dates to Month Day, Year format
-        start_date = datetime.strptime(df['Date'].iloc[0], '%Y-%m-%d').strftime('%B %d, %Y')
-        end_date = datetime.strptime(df['Date'].iloc[-1], '%Y-%m-%d').strftime('%B %d, %Y')
-        date_range = f"{start_date} to {end_date}"
-        
-        # Calculate overall completion rate
-        habit_columns = df.columns.drop('Date')
-        completion_rates = {}
-        for habit in habit_columns:
-            # Convert Yes/No to 1/0 for calculation
-            numeric_values = df[habit].map(lambda x: 1 if str(x).lower() == 'yes' else 0)
-            completion_rates[habit] = round(numeric_values.mean() * 100, 2)
+    # Rendered pages are kept per snapshot with their compressed variants
+    variants = get_page(etag)
+    count_cache('page', 'miss' if variants is None else 'memory')
+    if variants is None:
+        summary_stats = None
+        with span('stats'):
+            if latest_data and range_args:
+                # Ranges are answered from the snapshot's prefix-sum index
+                summary_stats = get_range_summary_stats(latest_data, date_from, date_to)
+            elif latest_data:
+                # Summary stats are cached per data snapshot (in memory and in a JSON
+                # sidecar shared by all workers), so pandas only runs when data changes
+                summary_stats = get_summary_stats(latest_data)
         
-        # Remove the 'Notes' habit if it exists
-        if 'Notes' in completion_rates:
-            del completion_rates['Notes']
-        
-        overall_rate = round(sum(completion_rates.values()) / len(completion_rates) if completion_rates else 0, 2)
-        
-        # Get detailed statistics for advanced metrics - lazy load analyzer
-        get_detailed_stats = load_analyzer()
-        detailed_stats = get_detailed_stats(df)
-        
-        summary_stats = {
-            'total_habits': total_habits,
-            'date_range': date_range,
-            'overall_rate': overall_rate,
-            'habit_rates': completion_rates,
-            'detailed_stats': detailed_stats  # Add detailed stats to the template context
-        }
+        with span('render'):
+            html = render_template('index.html', 
+                                   visual_files=visual_files, 
+                                   visual_versions=visual_versions,
+                                   latest_date=latest_date,
+                                   summary_stats=summary_stats,
+                                   client_charts=client_charts,
+                                   chart_mode=chart_mode,
+                                   tracker_id=tracker_id,
+                                   range_args=range_args)
+            variants = store_page(etag, html)
+    return send_variants(variants, etag, 'text/html', last_modified)
+
+@app.route('/api/series', defaults={'tracker_id': None})
+@app.route('/u/<tracker_id>/api/series')
+def api_series(tracker_id):
+    """Completion rates and cumulative completions as compact JSON for client-side charts"""
+    latest_data, _ = find_tracker_data(get_tracker_paths(tracker_id))
+    date_from, date_to = get_date_range()
+    if not latest_data:
+        return jsonify({'error': 'No habit data available'}), 404
     
-    return render_template('index.html', 
-                           visual_files=visual_files, 
-                           latest_date=latest_date,
-                           summary_stats=summary_stats)
+    # The ETag follows from the snapshot and range alone, so a revalidation
+    # gets its 304 before any series are built
+    etag = series_etag(latest_data, date_from, date_to)
+    if request.if_none_match.contains(etag):
+        return send_variants(None, etag, 'application/json')
+    
+    # The serialized body and its compressed variants are built once per
+    # snapshot (per request when limited to ?from=&to=)
+    with span('series'):
+        payload = get_series_payload(latest_data, date_from, date_to)
+    if payload is None:
+        return jsonify({'error': 'No habit data available'}), 404
+    return send_variants(payload['variants'], payload['etag'], 'application/json')
+
+@app.route('/api/refresh', methods=['GET', 'POST'], defaults={'tracker_id': None})
+@app.route('/u/<tracker_id>/api/refresh', methods=['GET', 'POST'])
+def api_refresh(tracker_id):
+    """Queue a background refresh of the tracker (POST) or report its refresh status (GET)"""
+    if refresher is None:
+        abort(404)
+    get_tracker_paths(tracker_id)
+    if request.method == 'GET':
+        return jsonify(refresher.status(tracker_id))
+    if REFRESH_TOKEN and not hmac.compare_digest(request.headers.get('Authorization', ''),
+                                                 f'Bearer {REFRESH_TOKEN}'):
+        abort(403)
+    return jsonify(refresher.request(tracker_id)), 202
+
+@app.route('/metrics')
+def metrics():
+    """Latency histograms and cache hit rates of this worker in Prometheus text format"""
+    if not instrumentation.ENABLED:
+        abort(404)
+    return Response(instrumentation.render_metrics(), mimetype='text/plain; version=0.0.4')
 
-@app.route('/visuals/<filename>')
-def serve_visual(filename):
-    """Serve visualization images"""
-    return send_from_directory(VISUALS_DIR, filename)
+@app.route('/visuals/<filename>', defaults={'tracker_id': None})
+@app.route('/u/<tracker_id>/visuals/<filename>')
+def serve_visual(filename, tracker_id):
+    """Serve visualization images, falling back to the content-addressed render cache"""
+    paths = get_tracker_paths(tracker_id)
+    if not os.path.exists(os.path.join(paths.visuals_dir, filename)) and \
+            os.path.exists(os.path.join(paths.render_cache_dir, filename)):
+        response = send_from_directory(paths.render_cache_dir, filename)
+    else:
+        response = send_from_directory(paths.visuals_dir, filename)
+    
+    # The page links charts as ?v=<content hash>; while that still matches,
+    # the URL's content can never change. Other URLs revalidate (ETag and
+    # Last-Modified). PNGs are already compressed, so no encoded variants.
+    version = request.args.get('v')
+    if version and response.status_code == 200 and version == visual_version(paths, filename):
+        response.headers['Cache-Control'] = f'public, max-age={IMMUTABLE_MAX_AGE}, immutable'
+    return response
 
 # Make sure output directories exist
 os.makedirs(DATA_DIR, exist_ok=True)
 os.makedirs(VISUALS_DIR, exist_ok=True)
 
-# Create sample data file for demo mode
-def create_demo_data():
-    """Creates sample data for portfolio display when no Google Sheets connection is available"""
-    # Always recreate demo data when in demo mode
-    print("Generating/refreshing demo data for portfolio display")
-    # Lazy load pandas
-    pd = load_pandas()
-    # Sample habit data
-    data = {
-        'Date': pd.date_range('2025-04-22', '2025-05-08').strftime('%Y-%m-%d').tolist(),
-        'Walk': ['Yes', 'Yes', 'No', 'No', 'Yes', 'No', 'Yes', 'Yes', 'No', 'Yes', 'No', 'No', 'No', 'Yes', 'Yes', 'Yes', 'No'],
-        'Resistance Training': ['No', 'Yes', 'No', 'No', 'Yes', 'No', 'No', 'Yes', 'No', 'Yes', 'No', 'No', 'No', 'No', 'No', 'Yes', 'No'],
-        'Yoga': ['Yes', 'No', 'No', 'Yes', 'No', 'Yes', 'No', 'No', 'Yes', 'No', 'No', 'No', 'No', 'No', 'No', 'No', 'Yes'],
-        'Notes': ['15 walk outside', 'Did 10 counter pushups; 30 min treadmill walk', '', 'Short yoga sequence before bed', 
-                  '30 min walk; 10 counter pushups and a few resistance exercises', '', 'Evening 30 min walk on treadmill',
-                  'Hour long walk on the treadmill; 10 counter pushups', 'Tried out a new yoga channel on YT and really enjoyed it',
-                  '30 min treadmill walk', '', '', '', '45-min walk', 'Outdoor walk to shake off some frustration', 'Full workout', 'Yoga in the morning']
-    }
-    df = pd.DataFrame(data)
-    
-    # Save demo data
-    demo_file = os.path.join(DATA_DIR, 'habit_data_demo.csv')
-    df.to_csv(demo_file, index=False)
-    
-    # Generate sample visualizations
-    try:
-        # Import visualization functions only when needed - lazy loading
-        import importlib
-        analyzer = importlib.import_module('src.analyzer')
-        
-        # Generate bar chart visualization
-        bar_plot_path = os.path.join(VISUALS_DIR, 'habit_completion_demo.png')
-        analyzer.plot_completion_rates(df, save_path=bar_plot_path)
-        
-        # Generate line chart for habit trends
-        line_plot_path = os.path.join(VISUALS_DIR, 'habit_trends_demo.png')
-        analyzer.plot_habit_trends(df, save_path=line_plot_path)
-    except Exception as e:
-        print(f"Error generating demo visualizations: {e}")
-
-# Generate demo data if in demo mode
+# Demo data is built at deploy time (scripts/build_demo.py); only build it
+# here when that step didn't run, e.g. when starting the app locally
 if DEMO_MODE:
-    create_demo_data()
+    from src.demo import demo_artifacts_exist, create_demo_data
+    if not demo_artifacts_exist(OUTPUT_DIR):
+        try:
+            create_demo_data(OUTPUT_DIR, client_charts=CLIENT_CHARTS)
+        except Exception as e:
+            print(f"Error generating demo visualizations: {e}")
 
 if __name__ == '__main__':
     # Create templates directory if it doesn't exist
@@ -0,0 +1,47 @@
+# Benchmark: per-cell lambda encoding vs the shared encode_habits() matrix
+# Usage: python benchmarks/bench_encoding.py
+
+import os
+import sys
+import time
+
+# Add the project root to the path so we can import from src
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from src.analyzer import encode_habits, get_habit_columns
+from benchmarks.synthetic import make_tracker
+
+# (years of daily rows, number of habits)
+SIZES = [(1, 3), (3, 20), (5, 100), (10, 300)]
+REPEATS = 3
+
+
+def legacy_encode(df):
+    """The old approach: one Python lambda call per cell, per habit."""
+    return {
+        habit: df[habit].map(lambda x: 1 if str(x).lower() == 'yes' else 0)
+        for habit in get_habit_columns(df)
+    }
+
+
+def best_time(func, df):
+    timings = []
+    for _ in range(REPEATS):
+        start = time.perf_counter()
+        func(df)
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def main():
+    print(f"{'days':>6} {'habits':>6} {'legacy (s)':>12} {'encoded (s)':>12} {'speedup':>8}")
+    for years, habits in SIZES:
+        days = years * 365
+        df = make_tracker(days, habits)
+        legacy = best_time(legacy_encode, df)
+        encoded = best_time(encode_habits, df)
+        # Every request used to decode each column up to five times
+        print(f"{days:>6} {habits:>6} {legacy:>12.4f} {encoded:>12.4f} {legacy / encoded:>7.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,89 @@
+# Benchmark: web worker cold start (import time and memory of `import app`)
+# Usage: python benchmarks/bench_startup.py [--runs N] [--record FILE]
+#
+# Each run imports app.py in a fresh interpreter with `python -X importtime`,
+# as a gunicorn worker would, and reports wall time, peak RSS, the slowest
+# top-level imports and whether pandas/matplotlib were pulled in at boot.
+# Build the demo artifacts first (scripts/build_demo.py) to measure the
+# DEMO_MODE boot that production runs.
+
+import argparse
+import json
+import os
+import re
+import subprocess
+import sys
+import time
+from datetime import datetime
+
+PROJECT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+# Modules we never want on the worker boot path
+HEAVY_MODULES = ['pandas', 'numpy', 'matplotlib', 'seaborn']
+
+# Prints peak RSS (KB on Linux) and the heavy modules that got imported
+PROBE = (
+    "import resource, sys, app; "
+    "print('RSS', resource.getrusage(resource.RUSAGE_SELF).ru_maxrss); "
+    f"print('HEAVY', ','.join(m for m in {HEAVY_MODULES!r} if m in sys.modules))"
+)
+
+IMPORTTIME_LINE = re.compile(r'import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)')
+
+
+def run_once(env):
+    start = time.perf_counter()
+    proc = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', PROBE],
+        cwd=PROJECT_DIR, env=env, capture_output=True, text=True, check=True
+    )
+    wall = time.perf_counter() - start
+
+    rss_kb = int(re.search(r'^RSS (\d+)', proc.stdout, re.M).group(1))
+    heavy = re.search(r'^HEAVY (.*)$', proc.stdout, re.M).group(1)
+
+    # Cumulative time of each top-level import (the least indented lines)
+    top_level = []
+    for line in proc.stderr.splitlines():
+        match = IMPORTTIME_LINE.match(line)
+        if match and len(match.group(3)) == 1:
+            top_level.append((int(match.group(2)), match.group(4)))
+    top_level.sort(reverse=True)
+
+    return {
+        'wall_s': wall,
+        'rss_mb': rss_kb / 1024,
+        'heavy_modules': [m for m in heavy.split(',') if m],
+        'top_imports_us': top_level[:8]
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure web worker cold start")
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--record', metavar='FILE', help="append the result to a JSON lines history file")
+    args = parser.parse_args()
+
+    env = dict(os.environ, DEMO_MODE=os.environ.get('DEMO_MODE', 'true'))
+    runs = [run_once(env) for _ in range(args.runs)]
+    best = min(runs, key=lambda r: r['wall_s'])
+
+    print(f"Worker boot (best of {args.runs}): {best['wall_s'] * 1000:.0f} ms, peak RSS {best['rss_mb']:.1f} MB")
+    print(f"Heavy modules imported at boot: {', '.join(best['heavy_modules']) or 'none'}")
+    print("Slowest top-level imports:")
+    for micros, module in best['top_imports_us']:
+        print(f"  {micros / 1000:8.1f} ms  {module}")
+
+    if args.record:
+        entry = {
+            'timestamp': datetime.now().isoformat(timespec='seconds'),
+            'wall_ms': round(best['wall_s'] * 1000, 1),
+            'rss_mb': round(best['rss_mb'], 1),
+            'heavy_modules': best['heavy_modules']
+        }
+        with open(args.record, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(entry) + '\n')
+
+
+if __name__ == '__main__':
+    main()
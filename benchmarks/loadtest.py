@@ -0,0 +1,445 @@
+# Load test: the dashboard's endpoints under concurrent requests
+# Usage: python benchmarks/loadtest.py [--server gunicorn|testclient] [--workers N] [--concurrency C]
+#                                       [--requests N] [--sizes 365x5,3650x100] [--endpoints page,visual,...]
+#                                       [--json FILE] [--keep-data]
+#
+# For each synthetic dataset size (days x habits, benchmarks/synthetic.py) a
+# tracker is generated with scripts/generate_dashboard.py under
+# output/trackers/loadtest-<days>x<habits>/ and removed again afterwards
+# (unless --keep-data). Each endpoint is then driven by C asyncio clients
+# until N requests completed, and the run reports throughput, p50/p95/p99
+# latency, errors and the time of the endpoint's first (cold) request,
+# followed by the resident memory of the workers.
+#
+# --server gunicorn runs `gunicorn app:app` with --workers processes on a
+# local port, as production does, and speaks HTTP/1.1 to it; worker RSS is
+# read from /proc (Linux). --server testclient needs no gunicorn: requests go
+# through Flask's test client on a thread pool inside this process, which
+# measures the app's own cost per request but not real parallelism.
+
+import argparse
+import asyncio
+import gzip
+import json
+import os
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+PROJECT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.append(PROJECT_DIR)
+from benchmarks.synthetic import make_tracker
+from src.trackers import tracker_paths
+
+OUTPUT_DIR = os.path.join(PROJECT_DIR, 'output')
+GENERATOR = os.path.join(PROJECT_DIR, 'scripts', 'generate_dashboard.py')
+
+# (days of daily rows, number of habits)
+SIZES = [(365, 5), (3 * 365, 20), (10 * 365, 100)]
+
+# Endpoint name -> what is requested (see endpoint_requests())
+ENDPOINTS = ['page', 'page_range', 'page_revalidate', 'visual', 'series']
+
+START_DATE = '2015-01-01'
+
+# Days covered by the page_range endpoint's ?from=&to=
+RANGE_DAYS = 90
+
+SERVER_START_TIMEOUT = 30
+
+
+def parse_sizes(text):
+    sizes = []
+    for item in text.split(','):
+        days, habits = item.lower().split('x')
+        sizes.append((int(days), int(habits)))
+    return sizes
+
+
+def percentile(sorted_values, q):
+    """Nearest-rank percentile ``q`` (0-100) of already sorted values."""
+    if not sorted_values:
+        return float('nan')
+    rank = max(1, -(-len(sorted_values) * q // 100))
+    return sorted_values[int(rank) - 1]
+
+
+def generate_tracker(days, habits):
+    """Generate the synthetic tracker of one size; returns its tracker id."""
+    tracker_id = f'loadtest-{days}x{habits}'
+    with tempfile.TemporaryDirectory() as tmp:
+        csv_path = os.path.join(tmp, f'{tracker_id}.csv')
+        make_tracker(days, habits, missing_rate=0.02, irregular_rate=0.01, start=START_DATE).to_csv(csv_path, index=False)
+        subprocess.run([sys.executable, GENERATOR, '--offline', csv_path, '--tracker', tracker_id],
+                       cwd=PROJECT_DIR, check=True, stdout=subprocess.DEVNULL)
+    return tracker_id
+
+
+def remove_tracker(tracker_id):
+    shutil.rmtree(tracker_paths(OUTPUT_DIR, tracker_id).root, ignore_errors=True)
+
+
+def read_rss_mb(pid):
+    """Resident memory of a process in MB, from /proc (None where that isn't available)."""
+    try:
+        with open(f'/proc/{pid}/status', encoding='ascii') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return None
+
+
+def child_pids(parent_pid):
+    """Pids of the direct children of ``parent_pid`` (Linux only; empty elsewhere)."""
+    children = []
+    try:
+        pids = [name for name in os.listdir('/proc') if name.isdigit()]
+    except OSError:
+        return children
+    for pid in pids:
+        try:
+            with open(f'/proc/{pid}/stat', encoding='ascii') as f:
+                # The command name may contain spaces, so split after its closing parenthesis
+                fields = f.read().rsplit(')', 1)[1].split()
+        except (OSError, IndexError):
+            continue
+        if int(fields[1]) == parent_pid:
+            children.append(int(pid))
+    return children
+
+
+class HttpConnection:
+    """A minimal HTTP/1.1 client connection for GET requests, reused while the server keeps it alive."""
+
+    def __init__(self, host, port):
+        self.host = host
+        self.port = port
+        self.reader = None
+        self.writer = None
+
+    async def get(self, path, headers=None, retry=True):
+        if self.writer is None:
+            self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+        lines = [f'GET {path} HTTP/1.1', f'Host: {self.host}:{self.port}', 'Accept-Encoding: gzip, br']
+        lines += [f'{name}: {value}' for name, value in (headers or {}).items()]
+        self.writer.write(('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1'))
+        try:
+            await self.writer.drain()
+            status_line = await self.reader.readline()
+        except ConnectionError:
+            status_line = b''
+        if not status_line:
+            # The server closed an idle keep-alive connection: reconnect once
+            self.close()
+            if retry:
+                return await self.get(path, headers, retry=False)
+            raise ConnectionError("connection closed before a response")
+
+        status = int(status_line.split()[1])
+        response_headers = {}
+        while True:
+            line = await self.reader.readline()
+            if line in (b'\r\n', b'\n', b''):
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            response_headers[name.strip().lower()] = value.strip()
+
+        if status in (204, 304) or 100 <= status < 200:
+            body = b''
+        elif 'content-length' in response_headers:
+            body = await self.reader.readexactly(int(response_headers['content-length']))
+        elif response_headers.get('transfer-encoding', '').lower() == 'chunked':
+            body = await self._read_chunked()
+        else:
+            body = await self.reader.read()
+            response_headers['connection'] = 'close'
+        if response_headers.get('connection', '').lower() == 'close':
+            self.close()
+        return status, response_headers, body
+
+    async def _read_chunked(self):
+        parts = []
+        while True:
+            size = int((await self.reader.readline()).split(b';')[0], 16)
+            if size == 0:
+                await self.reader.readline()
+                return b''.join(parts)
+            parts.append(await self.reader.readexactly(size))
+            await self.reader.readline()
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+        self.reader = self.writer = None
+
+
+class GunicornServer:
+    """``gunicorn app:app`` on a free local port; sessions are HTTP connections to it."""
+
+    def __init__(self, workers):
+        self.workers = workers
+        self.host = '127.0.0.1'
+        self.port = None
+        self.proc = None
+
+    def start(self):
+        with socket.socket() as s:
+            s.bind((self.host, 0))
+            self.port = s.getsockname()[1]
+        env = dict(os.environ)
+        env.pop('REFRESH_SOURCE', None)  # Don't regenerate snapshots while measuring
+        self.proc = subprocess.Popen(
+            [sys.executable, '-m', 'gunicorn', 'app:app', '--workers', str(self.workers),
+             '--bind', f'{self.host}:{self.port}', '--log-level', 'warning'],
+            cwd=PROJECT_DIR, env=env
+        )
+        deadline = time.monotonic() + SERVER_START_TIMEOUT
+        while time.monotonic() < deadline:
+            if self.proc.poll() is not None:
+                raise RuntimeError(f"gunicorn exited with status {self.proc.returncode}")
+            try:
+                socket.create_connection((self.host, self.port), timeout=1).close()
+                return
+            except OSError:
+                time.sleep(0.1)
+        self.stop()
+        raise RuntimeError(f"gunicorn didn't accept connections within {SERVER_START_TIMEOUT}s")
+
+    def stop(self):
+        if self.proc is not None:
+            self.proc.terminate()
+            self.proc.wait()
+            self.proc = None
+
+    def session(self):
+        return HttpConnection(self.host, self.port)
+
+    def worker_rss_mb(self):
+        return [rss for rss in map(read_rss_mb, child_pids(self.proc.pid)) if rss is not None]
+
+
+class TestClientSession:
+    """Requests through Flask's test client on the server's thread pool."""
+
+    def __init__(self, server):
+        self.server = server
+
+    async def get(self, path, headers=None):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.server.executor, self.server.request, path, headers)
+
+    def close(self):
+        pass
+
+
+class TestClientServer:
+    """The app imported into this process, driven by its test client from ``concurrency`` threads."""
+
+    def __init__(self, concurrency):
+        self.concurrency = concurrency
+        self.executor = None
+        self.app = None
+        self._local = threading.local()
+
+    def start(self):
+        os.environ.pop('REFRESH_SOURCE', None)
+        import app
+        self.app = app.app
+        self.executor = ThreadPoolExecutor(self.concurrency)
+
+    def stop(self):
+        if self.executor is not None:
+            self.executor.shutdown()
+
+    def request(self, path, headers=None):
+        client = getattr(self._local, 'client', None)
+        if client is None:
+            client = self._local.client = self.app.test_client()
+        response = client.get(path, headers=dict(headers or {}, **{'Accept-Encoding': 'gzip, br'}))
+        return response.status_code, {name.lower(): value for name, value in response.headers.items()}, response.data
+
+    def session(self):
+        return TestClientSession(self)
+
+    def worker_rss_mb(self):
+        rss = read_rss_mb(os.getpid())
+        return [] if rss is None else [rss]
+
+
+async def endpoint_requests(server, tracker_id, days, endpoints):
+    """
+    The (path, headers) requests of each endpoint, found from the tracker's
+    page: its chart URLs and its ETag (for page_revalidate).
+    """
+    base = f'/u/{tracker_id}/'
+    session = server.session()
+    status, headers, body = await session.get(base)
+    session.close()
+    if status != 200:
+        raise RuntimeError(f"{base} answered {status}")
+
+    last_day = datetime.strptime(START_DATE, '%Y-%m-%d') + timedelta(days=days - 1)
+    first_day = last_day - timedelta(days=RANGE_DAYS - 1)
+    visuals = _visual_urls(decode_body(headers, body).decode('utf-8'))
+
+    requests = {
+        'page': [(base, None)],
+        'page_range': [(f"{base}?from={first_day:%Y-%m-%d}&to={last_day:%Y-%m-%d}", None)],
+        'page_revalidate': [(base, {'If-None-Match': headers['etag']})] if headers.get('etag') else [],
+        'visual': [(url, None) for url in visuals],
+        'series': [(f'{base}api/series', None)]
+    }
+    return {name: requests[name] for name in endpoints if requests[name]}
+
+
+def decode_body(headers, body):
+    """Undo the response's Content-Encoding."""
+    encoding = headers.get('content-encoding')
+    if encoding == 'gzip':
+        return gzip.decompress(body)
+    if encoding == 'br':
+        import brotli  # The server only sends brotli when it is installed
+        return brotli.decompress(body)
+    return body
+
+
+def _visual_urls(html):
+    urls = []
+    for part in html.split('src="')[1:]:
+        url = part.split('"', 1)[0].replace('&amp;', '&')
+        if '/visuals/' in url:
+            urls.append(url)
+    return urls
+
+
+async def drive(server, requests, total, concurrency):
+    """
+    Send ``total`` requests cycling through ``requests`` from ``concurrency``
+    clients; returns the latency of each, the error count, the first request's
+    latency and the wall time.
+    """
+    latencies = []
+    errors = 0
+    next_index = 0
+
+    async def client():
+        nonlocal errors, next_index
+        session = server.session()
+        try:
+            while next_index < total:
+                path, headers = requests[next_index % len(requests)]
+                next_index += 1
+                start = time.perf_counter()
+                try:
+                    status, _, _ = await session.get(path, headers)
+                except (OSError, asyncio.IncompleteReadError, ValueError):
+                    status = None
+                    session.close()
+                latencies.append(time.perf_counter() - start)
+                if status not in (200, 304):
+                    errors += 1
+        finally:
+            session.close()
+
+    # The first request runs alone: it is the cold one that fills the caches
+    session = server.session()
+    start = time.perf_counter()
+    await session.get(*requests[0])
+    first = time.perf_counter() - start
+    session.close()
+
+    start = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(concurrency)))
+    return sorted(latencies), errors, first, time.perf_counter() - start
+
+
+async def run_size(server, days, habits, args):
+    tracker_id = f'loadtest-{days}x{habits}'
+    requests = await endpoint_requests(server, tracker_id, days, args.endpoints)
+    results = []
+    print(f"\n{days} days x {habits} habits ({args.requests} requests per endpoint, concurrency {args.concurrency})")
+    print(f"  {'endpoint':<16} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'max ms':>8} {'first ms':>9} {'errors':>7}")
+    for name, requests_of_endpoint in requests.items():
+        latencies, errors, first, wall = await drive(server, requests_of_endpoint, args.requests, args.concurrency)
+        result = {
+            'days': days,
+            'habits': habits,
+            'endpoint': name,
+            'requests': len(latencies),
+            'errors': errors,
+            'throughput': len(latencies) / wall if wall else None,
+            'p50_ms': percentile(latencies, 50) * 1000,
+            'p95_ms': percentile(latencies, 95) * 1000,
+            'p99_ms': percentile(latencies, 99) * 1000,
+            'max_ms': latencies[-1] * 1000 if latencies else None,
+            'first_ms': first * 1000
+        }
+        results.append(result)
+        print(f"  {name:<16} {result['throughput']:8.1f} {result['p50_ms']:8.2f} {result['p95_ms']:8.2f} "
+              f"{result['p99_ms']:8.2f} {result['max_ms']:8.2f} {result['first_ms']:9.2f} {errors:7d}")
+
+    rss = server.worker_rss_mb()
+    if rss:
+        print(f"  worker RSS: {', '.join(f'{mb:.1f}' for mb in rss)} MB (total {sum(rss):.1f} MB)")
+    for result in results:
+        result['worker_rss_mb'] = [round(mb, 1) for mb in rss]
+    return results
+
+
+async def run(server, args):
+    results = []
+    for days, habits in args.sizes:
+        results += await run_size(server, days, habits, args)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test the dashboard with concurrent requests")
+    parser.add_argument('--server', choices=['gunicorn', 'testclient'], default='gunicorn')
+    parser.add_argument('--workers', type=int, default=2, help="gunicorn worker processes (default: %(default)s)")
+    parser.add_argument('--concurrency', type=int, default=16, help="concurrent clients (default: %(default)s)")
+    parser.add_argument('--requests', type=int, default=500, help="requests per endpoint (default: %(default)s)")
+    parser.add_argument('--sizes', type=parse_sizes, default=SIZES, help="datasets as DAYSxHABITS,... (default: 365x5,1095x20,3650x100)")
+    parser.add_argument('--endpoints', type=lambda text: text.split(','), default=ENDPOINTS,
+                        help=f"comma-separated subset of {','.join(ENDPOINTS)}")
+    parser.add_argument('--json', metavar='FILE', help="also write the results to FILE")
+    parser.add_argument('--keep-data', action='store_true', help="keep the generated trackers in output/trackers/")
+    args = parser.parse_args()
+    unknown = set(args.endpoints) - set(ENDPOINTS)
+    if unknown:
+        parser.error(f"unknown endpoints: {', '.join(sorted(unknown))}")
+
+    print(f"Generating {len(args.sizes)} synthetic tracker(s)...")
+    tracker_ids = [generate_tracker(days, habits) for days, habits in args.sizes]
+
+    server = GunicornServer(args.workers) if args.server == 'gunicorn' else TestClientServer(args.concurrency)
+    try:
+        server.start()
+        results = asyncio.run(run(server, args))
+    finally:
+        server.stop()
+        if not args.keep_data:
+            for tracker_id in tracker_ids:
+                remove_tracker(tracker_id)
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump({
+                'timestamp': datetime.now().isoformat(timespec='seconds'),
+                'server': args.server,
+                'workers': args.workers if args.server == 'gunicorn' else 1,
+                'concurrency': args.concurrency,
+                'results': results
+            }, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,253 @@
+# Benchmark suite for the analyzer hot paths, with stored baselines
+# Usage: python benchmarks/run_benchmarks.py [--profile quick|full] [--filter TEXT] [--repeat N] [--min-time S]
+#                                            [--save] [--baseline FILE] [--tolerance 0.25]
+#
+# Every benchmark runs against seeded synthetic trackers (benchmarks/synthetic.py)
+# of several sizes. Results are compared with the baselines stored in
+# benchmarks/baselines.json; a benchmark whose best time is more than
+# --tolerance slower than its baseline is reported as a regression and the run
+# exits with status 1. Use --save to record new baselines after an intended
+# change (baselines are machine specific, so record and compare on the same box).
+
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import platform
+import tempfile
+import statistics
+import warnings
+from collections import namedtuple
+from datetime import datetime
+
+# Add the project root to the path so we can import from src
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from src.analyzer import load_data, summarize_habits, get_detailed_stats, write_store
+from benchmarks.synthetic import make_tracker
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baselines.json')
+
+# (days, habits, rate of both missing and irregular cells)
+PROFILES = {
+    'quick': [(30, 3, 0.0), (365, 20, 0.05), (1825, 100, 0.05)],
+    'full': [(days, habits, rate)
+             for days in (30, 365, 1825, 7300)  # A month to 20 years
+             for habits in (3, 20, 100, 500)
+             for rate in (0.0, 0.1)]
+}
+
+# Differences below this are timer noise, never a regression
+NOISE_FLOOR = 0.001
+
+# Fast benchmarks repeat until this many seconds are measured (at most MAX_REPEAT runs)
+MIN_TIME = 1.0
+MAX_REPEAT = 200
+
+# run() is timed; setup(), when given, runs untimed before every repeat
+Case = namedtuple('Case', ['run', 'setup'])
+
+Dataset = namedtuple('Dataset', ['name', 'df', 'csv_path', 'tmp_dir'])
+
+
+def dataset_name(days, habits, rate):
+    return f'd{days}-h{habits}-r{rate:g}'
+
+
+def build_dataset(days, habits, rate, tmp_dir):
+    df = make_tracker(days, habits, missing_rate=rate, irregular_rate=rate)
+    name = dataset_name(days, habits, rate)
+    csv_path = os.path.join(tmp_dir, f'{name}.csv')
+    df.to_csv(csv_path, index=False)
+    return Dataset(name, df, csv_path, tmp_dir)
+
+
+def bench_load_data(dataset):
+    return Case(lambda: load_data(dataset.csv_path), None)
+
+
+def bench_summarize_habits(dataset):
+    return Case(lambda: summarize_habits(dataset.df), None)
+
+
+def bench_get_detailed_stats(dataset):
+    return Case(lambda: get_detailed_stats(dataset.df), None)
+
+
+def bench_plot_completion_rates(dataset):
+    from src.plotting import plot_completion_rates
+    save_path = os.path.join(dataset.tmp_dir, f'{dataset.name}_completion.png')
+    return Case(lambda: plot_completion_rates(dataset.df, save_path=save_path), None)
+
+
+def bench_plot_habit_trends(dataset):
+    from src.plotting import plot_habit_trends
+    save_path = os.path.join(dataset.tmp_dir, f'{dataset.name}_trends.png')
+    return Case(lambda: plot_habit_trends(dataset.df, save_path=save_path), None)
+
+
+def bench_plot_habit_calendar(dataset):
+    from src.plotting import plot_habit_calendar
+    save_path = os.path.join(dataset.tmp_dir, f'{dataset.name}_calendar.png')
+    return Case(lambda: plot_habit_calendar(dataset.df, save_path=save_path), None)
+
+
+def bench_plot_habit_small_multiples(dataset):
+    from src.plotting import plot_habit_small_multiples
+    save_path = os.path.join(dataset.tmp_dir, f'{dataset.name}_small_multiples.png')
+    return Case(lambda: plot_habit_small_multiples(dataset.df, save_path=save_path), None)
+
+
+def _dashboard_client(dataset):
+    """A Flask test client serving the dataset as tracker 'bench' from the temp directory."""
+    import app as webapp
+    from src.trackers import tracker_paths
+
+    # Tracker routes resolve their directories from OUTPUT_DIR on every request
+    webapp.OUTPUT_DIR = os.path.join(dataset.tmp_dir, dataset.name)
+    paths = tracker_paths(webapp.OUTPUT_DIR, 'bench')
+    os.makedirs(paths.visuals_dir, exist_ok=True)
+    write_store(dataset.df, paths.store_dir)
+    return webapp.app.test_client(), paths
+
+
+def bench_index_cold(dataset):
+    """Full page render with no cached stats: the first request after a data update."""
+    from src import stats_cache, http_cache, manifest
+
+    client, paths = _dashboard_client(dataset)
+
+    def forget_stats():
+        stats_cache._memory_cache.clear()
+        stats_cache._index_cache.clear()
+        http_cache._page_cache.clear()  # Rendered pages are kept per ETag
+        manifest._manifest_cache.clear()
+        sidecar = stats_cache.sidecar_path(paths.store_dir)
+        if os.path.exists(sidecar):
+            os.remove(sidecar)
+
+    return Case(lambda: client.get('/u/bench/'), forget_stats)
+
+
+def bench_index_warm(dataset):
+    """Full page render from the in-memory stats cache."""
+    client, _ = _dashboard_client(dataset)
+    return Case(lambda: client.get('/u/bench/'), None)
+
+
+# name -> (case factory, largest days * habits it is run on)
+BENCHMARKS = {
+    'load_data': (bench_load_data, None),
+    'summarize_habits': (bench_summarize_habits, None),
+    'get_detailed_stats': (bench_get_detailed_stats, None),
+    'plot_completion_rates': (bench_plot_completion_rates, 1_000_000),
+    'plot_habit_trends': (bench_plot_habit_trends, 1_000_000),
+    'plot_habit_calendar': (bench_plot_habit_calendar, 1_000_000),
+    'plot_habit_small_multiples': (bench_plot_habit_small_multiples, 1_000_000),
+    'index_cold': (bench_index_cold, None),
+    'index_warm': (bench_index_warm, None)
+}
+
+
+def time_case(case, repeat, min_time=MIN_TIME):
+    """
+    Best and median seconds over at least ``repeat`` timed runs, after one
+    untimed warm-up run. Fast cases keep repeating until ``min_time`` seconds
+    have been measured, so their best time isn't decided by a few noisy runs.
+    """
+    timings = []
+    for i in range(MAX_REPEAT + 1):
+        if i > repeat and sum(timings) >= min_time:
+            break
+        if case.setup:
+            case.setup()
+        start = time.perf_counter()
+        case.run()
+        if i:
+            timings.append(time.perf_counter() - start)
+    return min(timings), statistics.median(timings)
+
+
+def load_baselines(path):
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {'results': {}}
+
+
+def save_baselines(path, results, profile):
+    """Merge ``results`` into the baseline file (so a --filter run only updates its own entries)."""
+    baselines = load_baselines(path)
+    baselines.update({
+        'created': datetime.now().isoformat(timespec='seconds'),
+        'profile': profile,
+        'python': platform.python_version(),
+        'machine': f'{platform.system()} {platform.machine()}, {os.cpu_count()} CPU(s)'
+    })
+    baselines.setdefault('results', {}).update(results)
+    baselines['results'] = dict(sorted(baselines['results'].items()))
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(baselines, f, indent=2)
+        f.write('\n')
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the analyzer hot paths against stored baselines")
+    parser.add_argument('--profile', choices=sorted(PROFILES), default='quick')
+    parser.add_argument('--filter', default='', help="only run benchmarks whose name contains TEXT")
+    parser.add_argument('--repeat', type=int, default=5, help="minimum timed runs per benchmark")
+    parser.add_argument('--min-time', type=float, default=MIN_TIME,
+                        help="keep repeating fast benchmarks until this many seconds are measured")
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE, help="baseline file (default: %(default)s)")
+    parser.add_argument('--save', action='store_true', help="record the results as the new baselines")
+    parser.add_argument('--tolerance', type=float, default=0.25,
+                        help="slowdown versus the baseline reported as a regression (default: %(default)s)")
+    args = parser.parse_args()
+
+    # Legends with hundreds of habits can't fit; that's expected at these sizes
+    warnings.filterwarnings('ignore', message='Tight layout not applied')
+
+    baseline_results = load_baselines(args.baseline).get('results', {})
+    results = {}
+    regressions = []
+
+    print(f"{'benchmark':<48} {'best (ms)':>10} {'median (ms)':>12} {'baseline':>10} {'change':>8}")
+    tmp_dir = tempfile.mkdtemp(prefix='habit-bench-')
+    try:
+        for days, habits, rate in PROFILES[args.profile]:
+            dataset = None
+            for bench_name, (factory, max_cells) in BENCHMARKS.items():
+                key = f'{bench_name}[{dataset_name(days, habits, rate)}]'
+                if args.filter not in key or (max_cells and days * habits > max_cells):
+                    continue
+                if dataset is None:
+                    dataset = build_dataset(days, habits, rate, tmp_dir)
+
+                best, median = time_case(factory(dataset), args.repeat, args.min_time)
+                results[key] = {'best': round(best, 6), 'median': round(median, 6)}
+
+                line = f"{key:<48} {best * 1000:>10.2f} {median * 1000:>12.2f}"
+                baseline = baseline_results.get(key)
+                if baseline:
+                    change = best / baseline['best'] - 1
+                    line += f" {baseline['best'] * 1000:>10.2f} {change:>+7.0%}"
+                    if change > args.tolerance and best - baseline['best'] > NOISE_FLOOR:
+                        regressions.append(key)
+                        line += "  REGRESSION"
+                print(line)
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    if args.save:
+        save_baselines(args.baseline, results, args.profile)
+        print(f"\nSaved {len(results)} baseline(s) to {args.baseline}")
+    if regressions:
+        print(f"\n{len(regressions)} regression(s) over {args.tolerance:.0%}: {', '.join(regressions)}")
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,59 @@
+# Seeded synthetic habit trackers shaped like the Google Sheet export
+#
+# Used by the benchmarks to build trackers of any size; the same arguments
+# always produce the same data.
+
+import numpy as np
+import pandas as pd
+
+# Spellings people actually type into the sheet besides 'Yes' and 'No'
+IRREGULAR_YES = ['yes', 'YES', ' Yes', 'Yes ', 'y', 'TRUE', '1']
+IRREGULAR_NO = ['no', 'NO', ' No', 'No ', 'n', 'FALSE', '0']
+
+NOTES = ['', '', '', '30 min walk', 'Felt great', 'Busy day, skipped some', 'Short session before bed']
+
+
+def make_tracker(days, habits, missing_rate=0.0, irregular_rate=0.0, seed=0, start='2015-01-01'):
+    """
+    Build a synthetic tracker with the same shape as the Google Sheet export.
+
+    Parameters:
+    -----------
+    days : int
+        Number of consecutive daily rows
+    habits : int
+        Number of habit columns (named 'Habit 0', 'Habit 1', ...)
+    missing_rate : float, optional
+        Fraction of habit cells left empty
+    irregular_rate : float, optional
+        Fraction of habit cells spelled differently, e.g. 'yes', ' Yes' or 'TRUE'
+    seed : int, optional
+        Seed for the random generator
+    start : str, optional
+        First date of the tracker
+
+    Returns:
+    --------
+    pandas.DataFrame
+        Date column (YYYY-MM-DD), the habit columns and a Notes column
+    """
+    rng = np.random.default_rng(seed)
+    data = {'Date': pd.date_range(start, periods=days).strftime('%Y-%m-%d')}
+
+    # Every habit gets its own completion rate, and done days cluster into streaks
+    rates = rng.uniform(0.2, 0.9, habits)
+    for i in range(habits):
+        noise = rng.random(days)
+        done = (noise + np.roll(noise, 1)) / 2 < rates[i]
+        values = np.where(done, 'Yes', 'No').astype(object)
+
+        if irregular_rate:
+            irregular = rng.random(days) < irregular_rate
+            values[irregular & done] = rng.choice(IRREGULAR_YES, (irregular & done).sum())
+            values[irregular & ~done] = rng.choice(IRREGULAR_NO, (irregular & ~done).sum())
+        if missing_rate:
+            values[rng.random(days) < missing_rate] = np.nan
+        data[f'Habit {i}'] = values
+
+    data['Notes'] = rng.choice(NOTES, days)
+    return pd.DataFrame(data)
@@ -0,0 +1,27 @@
+# Build the demo data and charts once at deploy time, so web workers
+# started with DEMO_MODE=true don't have to load pandas or matplotlib.
+# Usage: python scripts/build_demo.py [--client-charts]
+
+import argparse
+import os
+import sys
+
+# Add the project root to the path so we can import from src
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from src.demo import create_demo_data
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the demo dashboard artifacts")
+    parser.add_argument('--client-charts', action='store_true',
+                        default=os.environ.get('CLIENT_CHARTS', 'False').lower() == 'true',
+                        help="skip the matplotlib charts (the browser draws them)")
+    args = parser.parse_args()
+
+    output_dir = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'output')
+    create_demo_data(output_dir, client_charts=args.client_charts)
+    print(f"Demo artifacts written to {output_dir}")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,73 +1,167 @@
 # Habit Tracker Dashboard Generator
 # Pulls data from Google Sheets and generates analytics
+#
+# Usage: python scripts/generate_dashboard.py [--tracker ID] [--sheet NAME] [--full-resync] [--offline SHEET_EXPORT.csv]
 
-import gspread
-from oauth2client.service_account import ServiceAccountCredentials
+import numpy as np
 import pandas as pd
-import matplotlib.pyplot as plt
-import seaborn as sns
+import argparse
 import os
 from datetime import datetime
 import sys
 
 # Add the project root to the path so we can import from src
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
-from src.analyzer import summarize_habits, plot_completion_rates, plot_habit_trends
-
-# Create output directories if they don't exist
-output_dir = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'output')
-data_dir = os.path.join(output_dir, 'data')
-visuals_dir = os.path.join(output_dir, 'visuals')
-
-os.makedirs(data_dir, exist_ok=True)
-os.makedirs(visuals_dir, exist_ok=True)
-
-# Path to your downloaded credentials JSON file
-creds_path = 'scripts/habit-tracker-key.json'
-
-# Set up Google Sheets access
-scope = ['https://spreadsheets.google.com/feeds', 'https://www.googleapis.com/auth/drive']
-creds = ServiceAccountCredentials.from_json_keyfile_name(creds_path, scope)
-client = gspread.authorize(creds)
-
-# Open your spreadsheet and select worksheet
-spreadsheet = client.open("Habit Tracker")
-worksheet = spreadsheet.sheet1  # or use .worksheet("Sheet1") if you renamed it
-
-# Convert to DataFrame
-data = worksheet.get_all_records()
-df = pd.DataFrame(data)
-
-# Process the data
-if not df.empty:
-    # Convert 'Date' to datetime
-    df['Date'] = pd.to_datetime(df['Date'])
-    df = df.sort_values('Date')
-    
-    # Save data to CSV
-    today = datetime.now().strftime("%Y-%m-%d")
-    csv_path = os.path.join(data_dir, f'habit_data_{today}.csv')
-    df.to_csv(csv_path, index=False)
-    print(f"Data saved to {csv_path}")
-    
-    # Generate summary
-    summary = summarize_habits(df)
-    print("\nHabit Completion Summary:")
-    for habit, rate in summary.items():
-        print(f"{habit}: {rate}%")
-    
-    # Generate bar chart visualization
-    bar_plot_path = os.path.join(visuals_dir, f'habit_completion_{today}.png')
-    plot_completion_rates(df, save_path=bar_plot_path)
-    print(f"\nBar chart visualization saved to {bar_plot_path}")
-    
-    # Generate line chart for habit trends over time
-    line_plot_path = os.path.join(visuals_dir, f'habit_trends_{today}.png')
-    plot_habit_trends(df, save_path=line_plot_path)
-    print(f"Line chart visualization saved to {line_plot_path}")
-    
-    # Display the latest data
-    print("\nLatest records:")
-    print(df.head())
-else:
-    print("No data found in the spreadsheet.")
+from src.analyzer import (get_habit_columns, summarize_habits, HabitStatsState, stream_store, append_store,
+                          read_store_meta)
+from src.stats_cache import get_summary_stats
+from src.sheets_sync import sync_worksheet, CsvWorksheet
+from src.validation import parse_dates
+from src.rendering import render_charts, chart_types
+from src.trackers import tracker_paths
+from src.manifest import write_manifest, read_manifest, prune_snapshots, DEFAULT_KEEP
+
+def main():
+    parser = argparse.ArgumentParser(description="Sync the habit sheet and regenerate the dashboard")
+    parser.add_argument('--full-resync', action='store_true', help="download every row instead of only new ones")
+    parser.add_argument('--offline', metavar='CSV', help="sync from a local export of the sheet instead of Google Sheets")
+    parser.add_argument('--tracker', metavar='ID', help="write to output/trackers/ID (served at /u/ID/) instead of the default tracker")
+    parser.add_argument('--sheet', default="Habit Tracker", help="name of the Google spreadsheet to sync (default: %(default)s)")
+    parser.add_argument('--keep', type=int, default=DEFAULT_KEEP,
+                        help="dated snapshots of each chart to keep; older ones are deleted (default: %(default)s)")
+    parser.add_argument('--chunksize', type=int,
+                        help="rows parsed at a time when rebuilding the store (default: sized to the sheet's width)")
+    args = parser.parse_args()
+
+    # Create output directories if they don't exist
+    output_dir = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'output')
+    try:
+        paths = tracker_paths(output_dir, args.tracker)
+    except ValueError as e:
+        parser.error(str(e))
+    data_dir = paths.data_dir
+    visuals_dir = paths.visuals_dir
+
+    os.makedirs(data_dir, exist_ok=True)
+    os.makedirs(visuals_dir, exist_ok=True)
+
+    if args.offline:
+        worksheet = CsvWorksheet(args.offline)
+    else:
+        import gspread
+        from oauth2client.service_account import ServiceAccountCredentials
+
+        # Path to your downloaded credentials JSON file
+        creds_path = 'scripts/habit-tracker-key.json'
+
+        # Set up Google Sheets access
+        scope = ['https://spreadsheets.google.com/feeds', 'https://www.googleapis.com/auth/drive']
+        creds = ServiceAccountCredentials.from_json_keyfile_name(creds_path, scope)
+        client = gspread.authorize(creds)
+
+        # Open your spreadsheet and select worksheet
+        spreadsheet = client.open(args.sheet)
+        worksheet = spreadsheet.sheet1  # or use .worksheet("Sheet1") if you renamed it
+
+    # Fetch only the rows added since the last run into the canonical local store
+    csv_path = os.path.join(data_dir, 'habit_data.csv')
+    sync = sync_worksheet(worksheet, csv_path, full=args.full_resync)
+    print(f"Sync mode: {sync.mode}, {len(sync.new_rows)} row(s) written to {csv_path}")
+
+    # Only the first rows are parsed here; the whole CSV is only streamed when the store is rebuilt
+    df = pd.read_csv(csv_path, nrows=5) if os.path.exists(csv_path) else pd.DataFrame()
+
+    # Process the data
+    if not df.empty:
+        today = datetime.now().strftime("%Y-%m-%d")
+
+        # The running stats state, folded forward run by run
+        state_path = os.path.join(data_dir, 'habit_stats_state.json')
+        try:
+            state = HabitStatsState.load(state_path) if os.path.exists(state_path) else None
+        except ValueError as e:
+            # Saved by an older version; rebuilt from the full history below
+            print(f"Ignoring {state_path}: {e}")
+            state = None
+        # First run or earlier rows changed: rebuild from the full history
+        rebuild = state is None or sync.mode == 'full' or state.habits != get_habit_columns(df)
+        if not rebuild and state.last_date is not None and len(sync.new_rows):
+            # A day logged again replaces its earlier row, which was already folded in
+            new_dates = parse_dates(pd.DataFrame(sync.new_rows)['Date'])
+            rebuild = bool((new_dates <= np.datetime64(state.last_date)).any())
+
+        store_dir = paths.store_dir
+        store_meta = None if rebuild else read_store_meta(store_dir)
+        if sync.mode == 'unchanged' and store_meta is not None and read_manifest(paths) is not None:
+            # Nothing new since the last run: the store, stats and charts are current
+            print(f"No new rows; {store_dir} and the dashboard are up to date")
+            print("\nLatest records:")
+            print(df.head())
+            return
+
+        encoded = None
+        if store_meta is not None and len(sync.new_rows):
+            # Only the new rows are parsed and added to the columnar store
+            try:
+                store_meta, encoded = append_store(store_dir, sync.new_rows)
+            except ValueError as e:
+                print(f"Rebuilding {store_dir}: {e}")
+                rebuild = True
+        if encoded is None:
+            # Stream the CSV mirror into the columnar store the web app memory-maps,
+            # folding every row into a fresh stats state on the way when rebuilding
+            store_meta, streamed = stream_store(csv_path, store_dir, chunksize=args.chunksize, build_state=rebuild)
+            encoded = streamed.encoded
+        print(f"Habit store updated in {store_dir} ({store_meta['rows']} rows)")
+
+        # Fold only the days added since the last run into the running stats state
+        if rebuild:
+            state = streamed.state
+            new_days = state.n_days
+        else:
+            new_days = state.update(sync.new_rows) if len(sync.new_rows) else 0
+        state.save(state_path)
+        print(f"Folded {new_days} new day(s) into {state_path}")
+
+        # Precompute the dashboard stats snapshot so the web app only has to read it
+        get_summary_stats(store_dir, detailed_stats=state.detailed_stats())
+
+        if not len(encoded.dates):
+            # Validation dropped every row; the manifest is still updated so
+            # the dashboard stops showing the previous snapshot's charts
+            print(f"\nNo rows with a readable date ({store_meta['validation']['invalid_dates']} skipped); "
+                  "no summary or charts generated.")
+            results = []
+        else:
+            # Generate summary
+            summary = summarize_habits(None, encoded=encoded)
+            print("\nHabit Completion Summary:")
+            for habit, rate in summary.items():
+                print(f"{habit}: {rate}%")
+
+            # Render every chart type in parallel, reusing cached renders when the
+            # habit data hasn't changed
+            jobs = [(chart_type, os.path.join(visuals_dir, f'{chart_type}_{today}.png'))
+                    for chart_type in chart_types()]
+            print()
+            cache_dir = paths.render_cache_dir
+            results = render_charts(encoded, jobs, cache_dir=cache_dir)
+            for result in results:
+                source = "reused from cache" if result.cached else f"{result.seconds:.2f}s"
+                print(f"{result.chart_type} chart saved to {result.path} ({source})")
+
+        # Point the web app at the new snapshot and charts, then drop old snapshots
+        write_manifest(paths, store_dir, csv_path=csv_path, rows=store_meta['rows'],
+                       habits=len(encoded.habits), charts=results)
+        removed = prune_snapshots(paths, keep=args.keep)
+        print(f"\nManifest updated; {len(removed)} old snapshot file(s) removed")
+
+        # Display the latest data
+        print("\nLatest records:")
+        print(df.head())
+    else:
+        print("No data found in the spreadsheet.")
+
+
+if __name__ == '__main__':
+    main()
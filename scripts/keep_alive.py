@@ -1,16 +1,22 @@
 import requests
 import time
-import os
 from datetime import datetime
 
 # URL of your Render deployment
 URL = "https://habit-tracker-analyzer.onrender.com"
 
+# ETag of the page from the last ping; sending it back lets the app answer
+# with a 304 instead of rendering and sending the whole dashboard
+last_etag = None
+
 def ping_application():
+    global last_etag
     try:
         start_time = time.time()
-        response = requests.get(URL)
+        headers = {'If-None-Match': last_etag} if last_etag else {}
+        response = requests.get(URL, headers=headers)
         elapsed = time.time() - start_time
+        last_etag = response.headers.get('ETag', last_etag)
         
         timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
         status = response.status_code
@@ -0,0 +1,234 @@
+"""
+Batch analytics over many trackers.
+
+Usage: python -m src.batch INPUT [--output DIR] [--workers N] [--chunksize N] [--no-charts]
+
+INPUT is a directory of tracker CSVs (one ``<tracker_id>.csv`` per tracker)
+or a manifest file listing one CSV path per line. Every tracker is analysed
+independently, so trackers are spread over a process pool in chunks; each
+worker writes the tracker's habit store, stats sidecar, charts and manifest into
+``output/trackers/<tracker_id>/`` (where the web app serves them at
+``/u/<tracker_id>/``) and returns its summary. The summaries are gathered
+into one JSON lines results file and per-stage throughput is reported at
+the end.
+"""
+import os
+import sys
+import json
+import time
+import argparse
+from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor
+
+# Work done for each tracker, in order: 'load' streams the CSV into the habit
+# store, 'store' writes the stats sidecar
+STAGES = ('load', 'stats', 'store', 'charts')
+
+
+def find_trackers(source):
+    """
+    List the trackers to process.
+
+    Parameters:
+    -----------
+    source : str
+        A directory of ``<tracker_id>.csv`` files, or a manifest file with one
+        CSV path per line (blank lines and ``#`` comments are skipped; relative
+        paths are relative to the manifest)
+
+    Returns:
+    --------
+    list of (str, str)
+        (tracker id, CSV path) pairs; the id is the CSV's file name without extension
+    """
+    if os.path.isdir(source):
+        paths = [os.path.join(source, name) for name in sorted(os.listdir(source))
+                 if name.endswith('.csv')]
+    else:
+        base_dir = os.path.dirname(os.path.abspath(source))
+        with open(source, 'r', encoding='utf-8') as f:
+            lines = [line.strip() for line in f]
+        paths = [os.path.join(base_dir, line) for line in lines if line and not line.startswith('#')]
+    return [(os.path.splitext(os.path.basename(path))[0], path) for path in paths]
+
+
+def process_tracker(tracker_id, csv_path, output_dir, charts=True):
+    """
+    Analyse one tracker and write its dashboard artifacts.
+
+    Returns a dict with the tracker's summary and the seconds spent in each
+    stage; failures are reported in its ``error`` field rather than raised so
+    one bad sheet doesn't stop the batch.
+    """
+    from src.trackers import tracker_paths
+
+    result = {'tracker_id': tracker_id, 'csv_path': csv_path, 'timings': {}}
+    timings = result['timings']
+    try:
+        paths = tracker_paths(output_dir, tracker_id)
+
+        start = time.perf_counter()
+        from src.analyzer import stream_store
+        # Parsed in chunks, so a huge export never has to fit in memory as a DataFrame
+        store_meta, streamed = stream_store(csv_path, paths.store_dir)
+        if not store_meta['rows']:
+            raise ValueError("no rows")
+        encoded = streamed.encoded
+        timings['load'] = time.perf_counter() - start
+
+        start = time.perf_counter()
+        from src.analyzer import summarize_habits, get_detailed_stats
+        habit_rates = summarize_habits(None, encoded=encoded)
+        detailed_stats = get_detailed_stats(None, encoded=encoded)
+        timings['stats'] = time.perf_counter() - start
+
+        start = time.perf_counter()
+        from src.stats_cache import get_summary_stats
+        summary_stats = get_summary_stats(paths.store_dir, detailed_stats=detailed_stats)
+        timings['store'] = time.perf_counter() - start
+
+        rendered = []
+        if charts:
+            start = time.perf_counter()
+            from src.rendering import render_charts, chart_types
+            os.makedirs(paths.visuals_dir, exist_ok=True)
+            today = datetime.now().strftime("%Y-%m-%d")
+            # Already running in a pool worker, so render serially here
+            rendered = render_charts(encoded, [
+                (chart_type, os.path.join(paths.visuals_dir, f'{chart_type}_{today}.png'))
+                for chart_type in chart_types()
+            ], max_workers=1, cache_dir=paths.render_cache_dir)
+            timings['charts'] = time.perf_counter() - start
+
+        from src.manifest import write_manifest, prune_snapshots
+        write_manifest(paths, paths.store_dir, rows=store_meta['rows'], habits=len(encoded.habits), charts=rendered)
+        prune_snapshots(paths)
+
+        result.update({
+            'days': len(encoded.dates),
+            'habits': len(encoded.habits),
+            'overall_rate': summary_stats['overall_rate'],
+            'habit_rates': habit_rates,
+            'detailed_stats': summary_stats['detailed_stats']
+        })
+    except Exception as e:
+        result['error'] = f"{type(e).__name__}: {e}"
+    return result
+
+
+def _process_chunk_item(item):
+    return process_tracker(*item)
+
+
+def _warm_up(charts):
+    # Import pandas (and matplotlib) once per worker, outside the stage timings
+    import pandas  # noqa: F401
+    import src.analyzer  # noqa: F401
+    if charts:
+        from src.rendering import _warm_up as warm_up_charts
+        warm_up_charts()
+
+
+def run_batch(trackers, output_dir, max_workers=None, chunksize=None, charts=True):
+    """
+    Process ``trackers`` across a pool of worker processes.
+
+    Parameters:
+    -----------
+    trackers : list of (str, str)
+        (tracker id, CSV path) pairs, see find_trackers()
+    output_dir : str
+        The app's output directory; results go to output_dir/trackers/<id>/
+    max_workers : int, optional
+        Size of the process pool (defaults to the CPU count); 1 runs in-process
+    chunksize : int, optional
+        Trackers handed to a worker at a time (defaults to about four chunks per worker)
+    charts : bool, optional
+        Also render each tracker's charts
+
+    Returns:
+    --------
+    list of dict
+        One process_tracker() result per tracker, in input order
+    """
+    items = [(tracker_id, path, output_dir, charts) for tracker_id, path in trackers]
+    if max_workers is None:
+        max_workers = os.cpu_count() or 1
+    max_workers = max(1, min(max_workers, len(items)))
+    if chunksize is None:
+        # Big enough to amortize the inter-process round trips, small enough
+        # that slow trackers don't leave the other workers idle at the end
+        chunksize = max(1, len(items) // (max_workers * 4))
+
+    if max_workers == 1:
+        _warm_up(charts)
+        return [_process_chunk_item(item) for item in items]
+    with ProcessPoolExecutor(max_workers=max_workers, initializer=_warm_up, initargs=(charts,)) as pool:
+        return list(pool.map(_process_chunk_item, items, chunksize=chunksize))
+
+
+def write_results(results, results_path):
+    """Write one JSON line per tracker result (NumPy values converted to plain JSON)."""
+    from src.stats_cache import _to_builtin
+
+    tmp_path = f'{results_path}.{os.getpid()}.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        for result in results:
+            f.write(json.dumps(_to_builtin(result)) + '\n')
+    os.replace(tmp_path, results_path)
+
+
+def report_throughput(results, wall_seconds, max_workers):
+    """Print overall and per-stage throughput of a batch run."""
+    failed = [r for r in results if 'error' in r]
+    print(f"Processed {len(results)} tracker(s) in {wall_seconds:.2f}s "
+          f"({len(results) / wall_seconds if wall_seconds else 0:.1f} trackers/sec, "
+          f"{max_workers} worker(s)), {len(failed)} failed")
+
+    # Stage times are summed over all workers, so trackers/sec here is the
+    # rate of a single core; multiply by the worker count for the pool's rate
+    print(f"{'stage':>8} {'cpu (s)':>10} {'trackers/sec/core':>18}")
+    for stage in STAGES:
+        seconds = sum(r['timings'][stage] for r in results if stage in r['timings'])
+        count = sum(1 for r in results if stage in r['timings'])
+        if count:
+            print(f"{stage:>8} {seconds:>10.2f} {count / seconds if seconds else 0:>18.1f}")
+
+    for result in failed[:10]:
+        print(f"  {result['tracker_id']}: {result['error']}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m src.batch', description="Analyse many tracker CSVs in parallel")
+    parser.add_argument('source', help="directory of <tracker_id>.csv files, or a manifest listing CSV paths")
+    parser.add_argument('--output', default=os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'output'),
+                        help="output directory (default: the app's output/)")
+    parser.add_argument('--results', help="JSON lines file for the aggregated results (default: OUTPUT/batch_results.jsonl)")
+    parser.add_argument('--workers', type=int, help="worker processes (default: CPU count)")
+    parser.add_argument('--chunksize', type=int, help="trackers per work chunk")
+    parser.add_argument('--no-charts', action='store_true', help="skip rendering charts")
+    args = parser.parse_args(argv)
+
+    trackers = find_trackers(args.source)
+    if not trackers:
+        print(f"No tracker CSVs found in {args.source}")
+        return 1
+
+    os.makedirs(args.output, exist_ok=True)
+    results_path = args.results or os.path.join(args.output, 'batch_results.jsonl')
+    max_workers = max(1, min(args.workers or os.cpu_count() or 1, len(trackers)))
+
+    start = time.perf_counter()
+    results = run_batch(trackers, args.output, max_workers, args.chunksize, charts=not args.no_charts)
+    wall_seconds = time.perf_counter() - start
+
+    write_results(results, results_path)
+    report_throughput(results, wall_seconds, max_workers)
+    print(f"Results written to {results_path}")
+    return 1 if any('error' in r for r in results) else 0
+
+
+if __name__ == '__main__':
+    # Make the project root importable when run as a script
+    sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    sys.exit(main())
@@ -0,0 +1,68 @@
+"""
+Sample data and charts for portfolio display when no Google Sheets
+connection is available.
+
+Built once at deploy time by ``scripts/build_demo.py`` rather than in every
+web worker; the app only falls back to building it when nothing is there.
+"""
+import os
+
+
+def demo_artifacts_exist(output_dir):
+    """Whether a previous build already produced the demo habit store."""
+    return os.path.exists(os.path.join(output_dir, 'data', 'habit_store', 'meta.json'))
+
+
+def create_demo_data(output_dir, client_charts=False):
+    """
+    Write the sample habit data (CSV and habit store) and render its charts.
+
+    Parameters:
+    -----------
+    output_dir : str
+        The app's output directory (containing data/ and visuals/)
+    client_charts : bool, optional
+        Skip the matplotlib charts when the browser draws them instead
+    """
+    import pandas as pd
+    from src.analyzer import encode_habits, get_habit_columns, write_store
+    from src.trackers import tracker_paths
+    from src.manifest import write_manifest
+
+    paths = tracker_paths(output_dir)
+    data_dir = paths.data_dir
+    visuals_dir = paths.visuals_dir
+    os.makedirs(data_dir, exist_ok=True)
+    os.makedirs(visuals_dir, exist_ok=True)
+
+    print("Generating/refreshing demo data for portfolio display")
+    # Sample habit data
+    data = {
+        'Date': pd.date_range('2025-04-22', '2025-05-08').strftime('%Y-%m-%d').tolist(),
+        'Walk': ['Yes', 'Yes', 'No', 'No', 'Yes', 'No', 'Yes', 'Yes', 'No', 'Yes', 'No', 'No', 'No', 'Yes', 'Yes', 'Yes', 'No'],
+        'Resistance Training': ['No', 'Yes', 'No', 'No', 'Yes', 'No', 'No', 'Yes', 'No', 'Yes', 'No', 'No', 'No', 'No', 'No', 'Yes', 'No'],
+        'Yoga': ['Yes', 'No', 'No', 'Yes', 'No', 'Yes', 'No', 'No', 'Yes', 'No', 'No', 'No', 'No', 'No', 'No', 'No', 'Yes'],
+        'Notes': ['15 walk outside', 'Did 10 counter pushups; 30 min treadmill walk', '', 'Short yoga sequence before bed', 
+                  '30 min walk; 10 counter pushups and a few resistance exercises', '', 'Evening 30 min walk on treadmill',
+                  'Hour long walk on the treadmill; 10 counter pushups', 'Tried out a new yoga channel on YT and really enjoyed it',
+                  '30 min treadmill walk', '', '', '', '45-min walk', 'Outdoor walk to shake off some frustration', 'Full workout', 'Yoga in the morning']
+    }
+    df = pd.DataFrame(data)
+
+    # Save demo data; the dashboard reads from the columnar store
+    csv_path = os.path.join(data_dir, 'habit_data_demo.csv')
+    df.to_csv(csv_path, index=False)
+    write_store(df, paths.store_dir)
+
+    # Charts drawn in the browser don't need matplotlib at all
+    if client_charts:
+        write_manifest(paths, paths.store_dir, csv_path=csv_path, rows=len(df), habits=len(get_habit_columns(df)))
+        return
+
+    # Generate every chart type, reused from the render cache when the demo
+    # data hasn't changed
+    from src.rendering import render_charts, chart_types
+    results = render_charts(encode_habits(df), [
+        (chart_type, os.path.join(visuals_dir, f'{chart_type}_demo.png')) for chart_type in chart_types()
+    ], max_workers=1, cache_dir=paths.render_cache_dir)
+    write_manifest(paths, paths.store_dir, csv_path=csv_path, rows=len(df), habits=len(get_habit_columns(df)), charts=results)
@@ -0,0 +1,100 @@
+"""
+HTTP caching for the dashboard.
+
+A page is identified by the snapshot it shows: the data snapshot's cache key,
+the content hashes of its charts and the request options. ``page_etag()``
+turns that into a strong ETag the app can compare with ``If-None-Match``
+before loading any statistics, and the rendered HTML is kept per ETag in
+memory together with its precompressed variants, so a revisit of an
+unchanged snapshot costs a dict lookup (or a 304 without a body).
+
+Charts are linked with their content hash in the URL (``?v=<hash>``);
+such a URL never changes content and is served with an immutable, long-lived
+``Cache-Control``.
+
+Brotli variants are built when the optional ``brotli`` package is
+installed; gzip is always available.
+"""
+import os
+import gzip
+import json
+import hashlib
+
+from src.stats_cache import LRUCache, MAX_CACHED_TRACKERS
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Bump when the page changes in a way its snapshot doesn't capture
+PAGE_CACHE_VERSION = 1
+
+# gzip level for page variants: 6 is several times faster than the default 9
+# for a few percent larger pages, and pages are compressed on every cold render
+GZIP_LEVEL = 6
+
+# Content encodings in order of preference
+ENCODINGS = ('br', 'gzip')
+
+# One year: the longest max-age caches honour
+IMMUTABLE_MAX_AGE = 31536000
+
+# Rendered pages: ETag -> compressed variants (a few date ranges per tracker)
+_page_cache = LRUCache(MAX_CACHED_TRACKERS * 4)
+
+_TEMPLATE_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                              'templates', 'index.html')
+
+
+def compress_variants(body):
+    """
+    The content encodings to serve ``body`` (bytes) with.
+
+    Returns:
+    --------
+    dict
+        Maps 'identity', 'gzip' and, with brotli installed, 'br' to the
+        encoded body
+    """
+    variants = {'identity': body, 'gzip': gzip.compress(body, compresslevel=GZIP_LEVEL)}
+    if brotli is not None:
+        variants['br'] = brotli.compress(body)
+    return variants
+
+
+def choose_encoding(accept_encodings, variants):
+    """The preferred encoding in ``variants`` the client accepts ('identity' when none)."""
+    for encoding in ENCODINGS:
+        if encoding in variants and accept_encodings[encoding]:
+            return encoding
+    return 'identity'
+
+
+def _template_version():
+    try:
+        return os.stat(_TEMPLATE_PATH).st_mtime_ns
+    except OSError:
+        return None
+
+
+def page_etag(*parts):
+    """
+    Strong ETag of a page made of the JSON-serializable ``parts`` (snapshot
+    key, chart versions, request options); the template's mtime is included
+    so an edited template invalidates pages browsers still hold.
+    """
+    key = json.dumps([PAGE_CACHE_VERSION, _template_version()] + list(parts), default=str)
+    return hashlib.sha1(key.encode('utf-8')).hexdigest()
+
+
+def get_page(etag):
+    """The cached variants of the page with ``etag``, or None."""
+    return _page_cache.get(etag)
+
+
+def store_page(etag, html):
+    """Compress the rendered page ``html`` (str), cache it under ``etag`` and return its variants."""
+    variants = compress_variants(html.encode('utf-8'))
+    _page_cache[etag] = variants
+    return variants
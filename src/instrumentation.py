@@ -0,0 +1,223 @@
+"""
+Opt-in request instrumentation.
+
+Set ``INSTRUMENTATION=true`` to enable it. Code marks its stages with
+``with span('name'):``; each span is timed into a latency histogram and
+collected for the current request, which the app reports in a
+``Server-Timing`` header. Cache lookups are counted by cache and result.
+``render_metrics()`` exposes everything in the Prometheus text format.
+Metrics are kept per process, so with several gunicorn workers each one
+reports its own.
+
+Set ``PROFILE_SLOW_REQUESTS`` to a number of seconds as well to sample the
+stack of every request while it runs and dump the samples of requests that
+take longer than that, as collapsed stacks (one ``frame;frame;... count``
+line per stack) that flamegraph.pl or speedscope can render.
+
+When instrumentation is off, ``span()`` returns a shared no-op context
+manager and nothing is recorded.
+"""
+import os
+import sys
+import time
+import threading
+import contextvars
+from collections import Counter as StackCounter
+from contextlib import contextmanager, nullcontext
+
+ENABLED = os.environ.get('INSTRUMENTATION', 'False').lower() == 'true'
+
+# Requests slower than this many seconds get their stack samples dumped (0 = off)
+PROFILE_SLOW_REQUESTS = float(os.environ.get('PROFILE_SLOW_REQUESTS') or 0)
+
+# Seconds between stack samples while profiling a request
+SAMPLE_INTERVAL = 0.005
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ''
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in pairs)
+    return '{' + ','.join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + '}'
+
+
+class Histogram:
+    """Cumulative-bucket latency histogram with labels, in the Prometheus style."""
+
+    def __init__(self, name, description, label_names, buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.description = description
+        self.label_names = tuple(label_names)
+        self.buckets = tuple(buckets)
+        self._series = {}  # label values -> [bucket counts..., sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, label_values, value):
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [0] * len(self.buckets) + [0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def collect(self):
+        lines = [f'# HELP {self.name} {self.description}', f'# TYPE {self.name} histogram']
+        with self._lock:
+            items = sorted((labels, list(series)) for labels, series in self._series.items())
+        for labels, series in items:
+            for bound, count in zip(self.buckets, series):
+                lines.append(f'{self.name}_bucket{_format_labels(self.label_names, labels, [("le", f"{bound:g}")])} {count}')
+            lines.append(f'{self.name}_bucket{_format_labels(self.label_names, labels, [("le", "+Inf")])} {series[-1]}')
+            lines.append(f'{self.name}_sum{_format_labels(self.label_names, labels)} {series[-2]:.6f}')
+            lines.append(f'{self.name}_count{_format_labels(self.label_names, labels)} {series[-1]}')
+        return lines
+
+
+class Counter:
+    """Monotonic counter with labels."""
+
+    def __init__(self, name, description, label_names):
+        self.name = name
+        self.description = description
+        self.label_names = tuple(label_names)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, label_values, amount=1):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def values(self):
+        with self._lock:
+            return dict(self._values)
+
+    def collect(self):
+        lines = [f'# HELP {self.name} {self.description}', f'# TYPE {self.name} counter']
+        for labels, value in sorted(self.values().items()):
+            lines.append(f'{self.name}{_format_labels(self.label_names, labels)} {value}')
+        return lines
+
+
+REQUEST_SECONDS = Histogram('habit_request_duration_seconds', "Request latency by endpoint", ['endpoint'])
+SPAN_SECONDS = Histogram('habit_span_duration_seconds', "Time spent in each instrumented stage", ['span'])
+CACHE_LOOKUPS = Counter('habit_cache_lookups_total', "Cache lookups by cache and where they were answered", ['cache', 'result'])
+
+# Spans recorded during the current request: list of (name, seconds), or None outside a request
+_request_spans = contextvars.ContextVar('habit_request_spans', default=None)
+
+_NO_SPAN = nullcontext()
+
+
+@contextmanager
+def _timed_span(name):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        seconds = time.perf_counter() - start
+        SPAN_SECONDS.observe((name,), seconds)
+        spans = _request_spans.get()
+        if spans is not None:
+            spans.append((name, seconds))
+
+
+def span(name):
+    """Context manager timing the stage ``name`` (a no-op unless instrumentation is enabled)."""
+    return _timed_span(name) if ENABLED else _NO_SPAN
+
+
+def count_cache(cache, result):
+    """Count a lookup in ``cache`` answered by ``result`` ('memory', 'disk', 'miss', ...)."""
+    if ENABLED:
+        CACHE_LOOKUPS.inc((cache, result))
+
+
+def begin_request():
+    """Start collecting spans for the current request; pass the result to end_request()."""
+    return _request_spans.set([])
+
+
+def end_request(token):
+    """Stop collecting spans and return the (name, seconds) pairs recorded since begin_request()."""
+    spans = _request_spans.get() or []
+    _request_spans.reset(token)
+    return spans
+
+
+def server_timing(spans, total=None):
+    """Format spans as a Server-Timing header value (durations in milliseconds)."""
+    entries = [f'{name};dur={seconds * 1000:.2f}' for name, seconds in spans]
+    if total is not None:
+        entries.append(f'total;dur={total * 1000:.2f}')
+    return ', '.join(entries)
+
+
+def render_metrics():
+    """All metrics of this process in the Prometheus text exposition format."""
+    lines = REQUEST_SECONDS.collect() + SPAN_SECONDS.collect() + CACHE_LOOKUPS.collect()
+
+    # Hit ratio per cache, so dashboards don't need to derive it
+    totals, hits = {}, {}
+    for (cache, result), value in CACHE_LOOKUPS.values().items():
+        totals[cache] = totals.get(cache, 0) + value
+        if result != 'miss':
+            hits[cache] = hits.get(cache, 0) + value
+    lines += ['# HELP habit_cache_hit_ratio Share of cache lookups answered without recomputing',
+              '# TYPE habit_cache_hit_ratio gauge']
+    for cache in sorted(totals):
+        lines.append(f'habit_cache_hit_ratio{_format_labels(["cache"], [cache])} {hits.get(cache, 0) / totals[cache]:.4f}')
+    return '\n'.join(lines) + '\n'
+
+
+class StackSampler:
+    """
+    Sampling profiler for one thread.
+
+    A background thread records the target thread's stack every
+    ``interval`` seconds until stop() is called; the samples are counted
+    per distinct stack, so the overhead doesn't depend on how much Python
+    code the profiled request runs.
+    """
+
+    def __init__(self, thread_id, interval=SAMPLE_INTERVAL):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.samples = StackCounter()
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stopped.set()
+        self._thread.join()
+        return self.samples
+
+    def _run(self):
+        while not self._stopped.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f'{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})')
+                frame = frame.f_back
+            if stack:
+                self.samples[';'.join(reversed(stack))] += 1
+
+
+def dump_profile(samples, profile_dir, label):
+    """Write collapsed stack samples to ``profile_dir`` and return the file path."""
+    os.makedirs(profile_dir, exist_ok=True)
+    path = os.path.join(profile_dir, f"{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}-{label}.txt")
+    with open(path, 'w', encoding='utf-8') as f:
+        for stack, count in samples.most_common():
+            f.write(f'{stack} {count}\n')
+    return path
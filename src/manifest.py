@@ -0,0 +1,224 @@
+"""
+Manifest of a tracker's current artifacts.
+
+The generator records the latest data snapshot (habit store and CSV, row
+and habit counts, content hash) and the latest chart of each type in
+``manifest.json`` at the tracker's root, replacing it atomically after
+everything it points to has been written. The web app then finds the page's
+data and charts with a single ``os.stat`` of the manifest instead of
+globbing and stat-ing every snapshot the generator ever produced, and only
+re-reads the file when it changes.
+
+Because the manifest says what is current, older dated snapshots can be
+pruned safely; see prune_snapshots().
+"""
+import os
+import re
+import json
+import hashlib
+from datetime import datetime
+
+from src.stats_cache import LRUCache, MAX_CACHED_TRACKERS, sidecar_path
+from src.instrumentation import count_cache
+
+MANIFEST_VERSION = 1
+MANIFEST_NAME = 'manifest.json'
+
+# How many dated snapshots of each chart (and CSV) prune_snapshots() keeps by default
+DEFAULT_KEEP = 7
+
+# Parsed manifests: path -> (mtime_ns, size, manifest)
+_manifest_cache = LRUCache(MAX_CACHED_TRACKERS)
+
+
+def manifest_path(paths):
+    """Where the manifest of the tracker with TrackerPaths ``paths`` lives."""
+    return os.path.join(paths.root, MANIFEST_NAME)
+
+
+def file_sha256(path):
+    """Hex SHA-256 of a file's contents."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _relative(paths, path):
+    return os.path.relpath(path, paths.root).replace(os.sep, '/')
+
+
+def write_manifest(paths, data_path, csv_path=None, rows=None, habits=None, charts=()):
+    """
+    Record the tracker's current data snapshot and charts.
+
+    Parameters:
+    -----------
+    paths : TrackerPaths
+        The tracker's directories
+    data_path : str
+        The snapshot the dashboard reads (habit store directory or CSV)
+    csv_path : str, optional
+        The CSV the snapshot was built from
+    rows, habits : int, optional
+        Number of rows and habits in the snapshot
+    charts : iterable of RenderResult or (str, str)
+        Chart type and image path of each current chart; a render's content
+        key is recorded too when available
+
+    Returns:
+    --------
+    dict
+        The manifest that was written
+    """
+    data = {
+        'path': _relative(paths, data_path),
+        'csv': _relative(paths, csv_path) if csv_path else None,
+        'sha256': file_sha256(csv_path) if csv_path else None,
+        'rows': rows,
+        'habits': habits
+    }
+    visuals = {}
+    for chart in charts:
+        chart_type, path = chart[0], chart[1]
+        visuals[chart_type] = {
+            'file': os.path.basename(path),
+            'sha256': file_sha256(path),
+            'render_key': getattr(chart, 'key', None)
+        }
+    manifest = {
+        'version': MANIFEST_VERSION,
+        'updated': datetime.now().isoformat(timespec='seconds'),
+        'data': data,
+        'visuals': visuals
+    }
+
+    target = manifest_path(paths)
+    os.makedirs(paths.root, exist_ok=True)
+    tmp_path = f'{target}.{os.getpid()}.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp_path, target)
+    return manifest
+
+
+def read_manifest(paths):
+    """
+    Return the tracker's manifest, or None when there is none (or it is from
+    another version). The parsed manifest is kept per process and only read
+    again when the file's mtime or size changes.
+    """
+    path = manifest_path(paths)
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    key = (stat.st_mtime_ns, stat.st_size)
+
+    cached = _manifest_cache.get(path)
+    if cached is not None and cached[0] == key:
+        count_cache('manifest', 'memory')
+        return cached[1]
+
+    count_cache('manifest', 'miss')
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if manifest.get('version') != MANIFEST_VERSION:
+        return None
+    _manifest_cache[path] = (key, manifest)
+    return manifest
+
+
+def manifest_data(paths, manifest):
+    """Absolute path of the manifest's data snapshot and its formatted update date, or (None, None)."""
+    data_path = os.path.join(paths.root, manifest['data']['path'])
+    if not os.path.exists(data_path):
+        return None, None
+    return data_path, datetime.fromisoformat(manifest['updated']).strftime('%B %d, %Y')
+
+
+def manifest_visuals(manifest):
+    """File names of the manifest's current charts, one per chart type."""
+    return [entry['file'] for entry in manifest['visuals'].values()]
+
+
+def _dated_groups(directory, extension):
+    """Group 'type_stamp.ext' files by type (the name without its last '_' part), newest first."""
+    groups = {}
+    try:
+        names = os.listdir(directory)
+    except OSError:
+        return groups
+    for name in names:
+        if not name.endswith(extension) or '_' not in name or '.tmp' in name:
+            continue
+        path = os.path.join(directory, name)
+        groups.setdefault(name.rsplit('_', 1)[0], []).append((os.path.getmtime(path), path))
+    return {kind: [path for _, path in sorted(files, reverse=True)] for kind, files in groups.items()}
+
+
+def _remove(path, removed):
+    try:
+        os.remove(path)
+        removed.append(path)
+    except OSError:
+        pass
+
+
+def prune_snapshots(paths, keep=DEFAULT_KEEP):
+    """
+    Delete old dated snapshots of a tracker, keeping what the manifest points to.
+
+    For each chart type (``habit_completion_<date>.png``, ...) and each dated
+    CSV series the newest ``keep`` files are kept; older ones are removed,
+    CSVs together with their stats and series sidecars. The content-addressed
+    render cache is trimmed to its ``keep`` newest renders per chart type.
+    Nothing is pruned for a tracker without a manifest.
+
+    Returns:
+    --------
+    list of str
+        Paths that were removed
+    """
+    manifest = read_manifest(paths)
+    if manifest is None:
+        return []
+    keep = max(1, keep)
+
+    protected = {os.path.abspath(os.path.join(paths.root, manifest['data']['path']))}
+    if manifest['data'].get('csv'):
+        protected.add(os.path.abspath(os.path.join(paths.root, manifest['data']['csv'])))
+    protected_keys = set()
+    for entry in manifest['visuals'].values():
+        protected.add(os.path.abspath(os.path.join(paths.visuals_dir, entry['file'])))
+        if entry.get('render_key'):
+            protected_keys.add(entry['render_key'])
+
+    removed = []
+    for directory, extension in ((paths.visuals_dir, '.png'), (paths.data_dir, '.csv')):
+        for files in _dated_groups(directory, extension).values():
+            for path in files[keep:]:
+                if os.path.abspath(path) in protected:
+                    continue
+                _remove(path, removed)
+                if extension == '.csv':
+                    for kind in ('stats', 'series'):
+                        if os.path.exists(sidecar_path(path, kind)):
+                            _remove(sidecar_path(path, kind), removed)
+
+    # Render cache entries are named by content key, so trim by age
+    renders = []
+    if os.path.isdir(paths.render_cache_dir):
+        for name in os.listdir(paths.render_cache_dir):
+            path = os.path.join(paths.render_cache_dir, name)
+            if re.fullmatch(r'[0-9a-f]{64}\.png', name):
+                renders.append((os.path.getmtime(path), path))
+    renders.sort(reverse=True)
+    for _, path in renders[keep * max(1, len(manifest['visuals'])):]:
+        if os.path.basename(path)[:-len('.png')] not in protected_keys:
+            _remove(path, removed)
+    return removed
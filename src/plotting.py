@@ -0,0 +1,395 @@
+"""
+Matplotlib charts for the habit dashboard.
+
+Importing this module loads matplotlib, so it is kept apart from the stats
+code in ``src.analyzer`` and only imported when a chart is actually drawn.
+
+Charts that span the whole history draw every habit with a few batched
+artists (one LineCollection, one image) instead of an artist per habit and
+point, and long series are decimated to what the image can show, so
+drawing time stays roughly flat as years of data accumulate.
+"""
+import matplotlib as mpl
+import numpy as np
+from matplotlib.collections import LineCollection, PolyCollection
+from matplotlib.colors import to_rgba
+from matplotlib.dates import DateFormatter, date2num
+from matplotlib.figure import Figure
+from matplotlib.lines import Line2D
+
+from src.analyzer import encode_habits, decimate_rows, CHART_STYLE, HABIT_COLORS, PRIMARY_COLOR
+from src.validation import to_calendar, DONE, NOT_LOGGED
+
+# Most points drawn per line; a chart a thousand pixels wide can't show more
+MAX_LINE_POINTS = 500
+
+# Point markers are only drawn on lines with at most this many points
+MAX_MARKER_POINTS = 60
+
+# Most points per small-multiples panel (a panel is a quarter of the chart wide)
+MAX_PANEL_POINTS = 200
+
+# Shortest rolling window of the small-multiples completion rates, in rows
+ROLLING_WINDOW = 7
+
+# Panels per row of the small-multiples chart
+SMALL_MULTIPLE_COLUMNS = 4
+
+# Weeks shown by the calendar heatmaps: a year, like a contribution graph
+CALENDAR_WEEKS = 53
+
+# Image pixels per calendar day; the last row and column of each are the gap
+CALENDAR_CELL = 6
+
+# Calendar colors of a day without a row in the sheet and of a missed habit
+EMPTY_DAY_COLOR = '#F9FAFB'
+MISSED_DAY_COLOR = '#E5E7EB'
+
+# Tall charts (many habits) stop growing here, in inches
+MAX_FIGURE_HEIGHT = 40
+
+def new_chart_figure(figsize=(10, 6)):
+    """
+    Create a figure and axes from the shared chart template.
+    
+    Uses the object-oriented Figure API, so nothing touches pyplot's global
+    figure manager and figures can be built concurrently and garbage collected.
+    """
+    with mpl.rc_context(CHART_STYLE):
+        fig = Figure(figsize=figsize)
+        ax = fig.add_subplot()
+    return fig, ax
+
+def _finish_chart(fig, save_path):
+    """Lay out the figure and save it; returns the figure when not saving."""
+    with mpl.rc_context(CHART_STYLE):
+        fig.tight_layout()
+        if save_path:
+            # The layout is already tight, so skip bbox_inches='tight' and its extra draw
+            fig.savefig(save_path, dpi=120, transparent=False)
+            return None
+    return fig
+
+def _empty_chart(save_path, message="No habits tracked"):
+    """A blank chart with ``message``, for sheets with nothing to plot (e.g. only Date and Notes)."""
+    fig, ax = new_chart_figure(figsize=(10, 2.5))
+    ax.text(0.5, 0.5, message, ha='center', va='center', fontsize=12, color='#6B7280',
+            transform=ax.transAxes)
+    ax.set_axis_off()
+    return _finish_chart(fig, save_path)
+
+def _habit_palette(habits):
+    """The color of each habit, consistent between charts."""
+    return [HABIT_COLORS.get(habit, PRIMARY_COLOR) for habit in habits]
+
+def _rgba_bytes(color):
+    return np.array([round(channel * 255) for channel in to_rgba(color)], dtype=np.uint8)
+
+def plot_completion_rates(df, save_path=None, encoded=None):
+    """
+    Creates a bar chart of each habit's overall completion rate.
+    
+    Parameters:
+    -----------
+    df : pandas.DataFrame
+        DataFrame containing the habit tracking data with Date column
+    save_path : str, optional
+        Path to save the visualization; without it the Figure is returned
+    encoded : EncodedHabits, optional
+        Result of encode_habits(df), to avoid encoding the habits again
+    """
+    if encoded is None:
+        encoded = encode_habits(df)
+    if not encoded.habits:
+        return _empty_chart(save_path)
+    if not len(encoded.dates):
+        return _empty_chart(save_path, "No days logged")
+    
+    # Completion rates straight from the encoded Yes/No matrix
+    rates = dict(zip(encoded.habits, encoded.matrix.mean(axis=0) * 100))
+    
+    # Map each habit to its assigned color
+    custom_palette = [HABIT_COLORS.get(habit, PRIMARY_COLOR) for habit in rates.keys()]
+    
+    fig, ax = new_chart_figure()
+    
+    # Plot with our custom styling, with a subtle white border on the bars
+    positions = np.arange(len(rates))
+    bars = ax.bar(positions, list(rates.values()), width=0.8, color=custom_palette,
+                  edgecolor='white', linewidth=1)
+    
+    # Add data labels on top of bars
+    for bar, rate in zip(bars, rates.values()):
+        ax.text(
+            bar.get_x() + bar.get_width()/2.,
+            bar.get_height() + 2,
+            f'{rate:.1f}%',
+            ha='center', va='bottom',
+            color='#1F2937',  # Match text color (--text-primary)
+            fontsize=9,
+            fontweight='bold'
+        )
+    
+    # Style the labels to match our UI - title is shown in the section header
+    ax.set_ylabel("Completion (%)", fontsize=12)
+    
+    # Set y-axis limits and add grid only on y-axis
+    ax.set_xlim(-0.5, len(rates) - 0.5)
+    ax.set_ylim(0, 105)  # Give a little extra room for the data labels
+    ax.grid(axis='x', visible=False)
+    ax.grid(axis='y', alpha=0.3)
+    
+    # Rotate habit names
+    ax.set_xticks(positions)
+    ax.set_xticklabels(list(rates.keys()), rotation=45, ha='right')
+    
+    return _finish_chart(fig, save_path)
+
+def plot_habit_trends(df, save_path=None, encoded=None):
+    """
+    Creates a line chart showing total habit completions over time.
+    
+    All habits are drawn as one LineCollection (plus one for the drop
+    shadows). Cumulative counts only ever grow, so long histories are
+    decimated to MAX_LINE_POINTS evenly spaced days without visibly changing
+    the lines, and point markers are only drawn on short ones.
+    
+    Parameters:
+    -----------
+    df : pandas.DataFrame
+        DataFrame containing the habit tracking data with Date column
+    save_path : str, optional
+        Path to save the visualization; without it the Figure is returned
+    encoded : EncodedHabits, optional
+        Result of encode_habits(df), to avoid encoding the habits again
+    """
+    if encoded is None:
+        encoded = encode_habits(df)
+    if not encoded.habits:
+        return _empty_chart(save_path)
+    habit_columns = encoded.habits
+    dates = encoded.dates
+    
+    # Cumulative completions for every habit at once (rows are in date order)
+    cumsums = np.cumsum(encoded.matrix, axis=0, dtype=np.int64)
+    
+    # Map each habit to its assigned color - ensures consistent colors between charts
+    custom_palette = _habit_palette(habit_columns)
+    
+    fig, ax = new_chart_figure()
+    
+    # One (points x 2) segment per habit over the decimated days
+    rows = decimate_rows(len(dates), MAX_LINE_POINTS)
+    x = date2num(dates[rows])
+    segments = np.empty((len(habit_columns), len(rows), 2))
+    segments[:, :, 0] = x
+    segments[:, :, 1] = cumsums[rows].T
+    
+    # Drop shadows for depth, then the lines themselves
+    ax.add_collection(LineCollection(segments, colors=custom_palette, linewidths=5, alpha=0.2))
+    ax.add_collection(LineCollection(segments, colors=custom_palette, linewidths=3))
+    markers = len(rows) <= MAX_MARKER_POINTS
+    if markers:
+        ax.scatter(np.tile(x, len(habit_columns)), segments[:, :, 1].ravel(), s=36,
+                   c=np.repeat(custom_palette, len(rows)), zorder=3)
+    ax.xaxis_date()
+    ax.autoscale_view()
+    
+    # Add last value annotation (none when no day passed validation)
+    for i in range(len(habit_columns) if len(rows) else 0):
+        ax.annotate(
+            f'{cumsums[-1, i]}',
+            xy=(x[-1], cumsums[-1, i]),
+            xytext=(5, 0),
+            textcoords='offset points',
+            color='#1F2937',
+            fontweight='bold',
+            fontsize=10
+        )
+    
+    # Style the labels - title is shown in the section header
+    ax.set_ylabel("Total Completions", fontsize=12)
+    
+    # Format the date on x-axis: Apr 22 within a year, Apr 2022 beyond
+    long_range = len(dates) and dates[-1] - dates[0] > np.timedelta64(366, 'D')
+    ax.xaxis.set_major_formatter(DateFormatter('%b %Y' if long_range else '%b %d'))
+    for label in ax.get_xticklabels():
+        label.set_rotation(30)
+        label.set_ha('right')
+    ax.grid(axis='y', alpha=0.3)
+    
+    # Add legend with custom styling; the collections have no per-habit
+    # entries, so it gets one proxy line per habit
+    handles = [Line2D([], [], color=color, linewidth=3, marker='o' if markers else None, markersize=6, label=habit)
+               for habit, color in zip(habit_columns, custom_palette)]
+    legend = ax.legend(
+        handles=handles,
+        loc='upper left',
+        frameon=True,
+        fontsize=10
+    )
+    frame = legend.get_frame()
+    frame.set_facecolor('white')
+    frame.set_alpha(0.9)
+    frame.set_edgecolor('#E5E7EB')
+    
+    return _finish_chart(fig, save_path)
+
+def plot_habit_calendar(df, save_path=None, encoded=None, weeks=CALENDAR_WEEKS):
+    """
+    Creates a calendar heatmap per habit of its last ``weeks`` weeks, one
+    column per week and one row per weekday (Monday on top), like a
+    contribution graph.
+    
+    Every habit's calendar is painted into a single RGBA image drawn with
+    one ``imshow``, so the chart costs the same however long the history
+    is. Days that weren't logged (see src.validation.to_calendar) stay blank.
+    
+    Parameters:
+    -----------
+    df : pandas.DataFrame
+        DataFrame containing the habit tracking data with Date column
+    save_path : str, optional
+        Path to save the visualization; without it the Figure is returned
+    encoded : EncodedHabits, optional
+        Result of encode_habits(df), to avoid encoding the habits again
+    weeks : int, optional
+        Most weeks shown, ending with the week of the last logged day
+    """
+    if encoded is None:
+        encoded = encode_habits(df)
+    if not encoded.habits:
+        return _empty_chart(save_path)
+    habits = encoded.habits
+    dates = encoded.dates.astype('datetime64[D]')
+    
+    # Monday-aligned window of whole weeks ending with the last logged day,
+    # no longer than the history (1970-01-01, day 0, was a Thursday)
+    last = dates[-1] if len(dates) else np.datetime64('today', 'D')
+    first = dates[0] if len(dates) else last
+    last_weekday = int((last.astype(np.int64) + 3) % 7)
+    first_monday = first - int((first.astype(np.int64) + 3) % 7)
+    start = max(last - last_weekday - 7 * (weeks - 1), first_monday)
+    weeks = int((last - start).astype(np.int64)) // 7 + 1
+    _, states = to_calendar(encoded, start, last)
+    offsets = np.arange(len(states))
+    
+    # Seven rows per habit plus a blank row between habits; each habit's
+    # colors are looked up by state (missed, done, not logged)
+    image = np.zeros((len(habits) * 8 - 1, weeks, 4), dtype=np.uint8)
+    colors = np.array([[_rgba_bytes(MISSED_DAY_COLOR), _rgba_bytes(color), _rgba_bytes(EMPTY_DAY_COLOR)]
+                       for color in _habit_palette(habits)]).reshape(len(habits), 3, 4)
+    image_rows = np.arange(len(habits)) * 8 + offsets[:, None] % 7
+    image[image_rows, offsets[:, None] // 7] = colors[np.arange(len(habits)), states]
+    
+    # Blow each day up to a square with a transparent gap on its right and bottom
+    cell = CALENDAR_CELL
+    image = np.repeat(np.repeat(image, cell, axis=0), cell, axis=1)
+    image[cell - 1::cell, :, 3] = 0
+    image[:, cell - 1::cell, 3] = 0
+    
+    # Days keep the size a full year gets across the chart, and stay square
+    # until the chart would get too tall
+    height = len(habits) * 8 * 10 / (CALENDAR_WEEKS + 12) + 1
+    fig, ax = new_chart_figure(figsize=(10, min(max(height, 2.5), MAX_FIGURE_HEIGHT)))
+    ax.imshow(image, aspect='equal' if height <= MAX_FIGURE_HEIGHT else 'auto')
+    
+    # Habit names on the left, completion rate over the window on the right
+    centers = (np.arange(len(habits)) * 8 + 3.5) * cell
+    ax.set_yticks(centers)
+    ax.set_yticklabels(habits)
+    logged = (states != NOT_LOGGED).sum(axis=0)
+    rates = (states == DONE).sum(axis=0) / np.maximum(logged, 1) * 100
+    for center, rate in zip(centers, rates):
+        ax.text(weeks * cell + cell, center, f'{rate:.0f}%', va='center', ha='left',
+                color='#1F2937', fontsize=9, fontweight='bold')
+    
+    # Month names above the week in which each month starts
+    months = np.arange(start.astype('datetime64[M]') + 1, last.astype('datetime64[M]') + 1)
+    month_starts = months.astype('datetime64[D]')
+    ax.set_xticks(((month_starts - start).astype(np.int64) // 7 + 0.5) * cell)
+    ax.set_xticklabels([month.strftime('%b') for month in months.astype(object)], fontsize=9)
+    ax.xaxis.tick_top()
+    ax.tick_params(length=0)
+    ax.grid(False)
+    for spine in ax.spines.values():
+        spine.set_visible(False)
+    
+    return _finish_chart(fig, save_path)
+
+def plot_habit_small_multiples(df, save_path=None, encoded=None, columns=SMALL_MULTIPLE_COLUMNS):
+    """
+    Creates one small panel per habit showing its rolling completion rate
+    over the whole history, on a shared 0-100% scale.
+    
+    The panels are laid out inside a single Axes: each habit's curve is
+    shifted into its cell, so the whole grid is one LineCollection, one
+    PolyCollection of panel backgrounds and a label per habit. The rolling
+    window grows with the history (never below ROLLING_WINDOW days) so that
+    each of the at most MAX_PANEL_POINTS drawn points averages the days it
+    stands for.
+    
+    Parameters:
+    -----------
+    df : pandas.DataFrame
+        DataFrame containing the habit tracking data with Date column
+    save_path : str, optional
+        Path to save the visualization; without it the Figure is returned
+    encoded : EncodedHabits, optional
+        Result of encode_habits(df), to avoid encoding the habits again
+    columns : int, optional
+        Number of panels per row
+    """
+    if encoded is None:
+        encoded = encode_habits(df)
+    if not encoded.habits:
+        return _empty_chart(save_path)
+    habits = encoded.habits
+    dates = encoded.dates.astype('datetime64[D]')
+    days = len(dates)
+    columns = max(1, min(columns, len(habits)))
+    grid_rows = -(-len(habits) // columns)
+    
+    # Rolling completion rates at the decimated rows, from cumulative sums
+    window = max(ROLLING_WINDOW, -(-days // MAX_PANEL_POINTS))
+    cumsums = np.zeros((days + 1, len(habits)), dtype=np.int64)
+    np.cumsum(encoded.matrix, axis=0, out=cumsums[1:])
+    rows = decimate_rows(days, MAX_PANEL_POINTS)
+    window_starts = np.maximum(rows + 1 - window, 0)
+    rates = (cumsums[rows + 1] - cumsums[window_starts]) / (rows + 1 - window_starts)[:, None]
+    
+    # Position within a panel: time from 0 to 1 across the x axis, rate up the y axis
+    span_days = max(int((dates[-1] - dates[0]).astype(np.int64)), 1) if days else 1
+    x = (dates[rows] - dates[0]).astype(np.int64) / span_days if days else np.zeros(0)
+    gap_x, gap_y = 0.12, 0.45
+    panel_x = np.arange(len(habits)) % columns * (1 + gap_x)
+    panel_y = -(np.arange(len(habits)) // columns) * (1 + gap_y)
+    
+    segments = np.empty((len(habits), len(rows), 2))
+    segments[:, :, 0] = panel_x[:, None] + x[None, :]
+    segments[:, :, 1] = panel_y[:, None] + rates.T
+    
+    fig, ax = new_chart_figure(figsize=(10, min(grid_rows * 1.6 + 0.6, MAX_FIGURE_HEIGHT)))
+    panels = [[(px, py), (px + 1, py), (px + 1, py + 1), (px, py + 1)] for px, py in zip(panel_x, panel_y)]
+    ax.add_collection(PolyCollection(panels, facecolors='#F9FAFB', edgecolors='#E5E7EB', linewidths=1))
+    # A faint 50% line across every panel
+    halfway = [[(px, py + 0.5), (px + 1, py + 0.5)] for px, py in zip(panel_x, panel_y)]
+    ax.add_collection(LineCollection(halfway, colors='#E5E7EB', linewidths=1, linestyles='dashed'))
+    ax.add_collection(LineCollection(segments, colors=_habit_palette(habits), linewidths=2))
+    
+    # Habit name and overall completion rate above each panel
+    overall = encoded.matrix.mean(axis=0) * 100 if days else np.zeros(len(habits))
+    for habit, px, py, rate in zip(habits, panel_x, panel_y, overall):
+        ax.text(px, py + 1.04, habit, ha='left', va='bottom', fontsize=9, color='#1F2937', fontweight='bold')
+        ax.text(px + 1, py + 1.04, f'{rate:.0f}%', ha='right', va='bottom', fontsize=9, color='#6B7280')
+    
+    if days:
+        caption = (f"{window}-day rolling completion rate, "
+                   f"{dates[0].astype(object):%b %d, %Y} to {dates[-1].astype(object):%b %d, %Y}")
+        ax.text(0, panel_y.min() - 0.08, caption, ha='left', va='top', fontsize=9, color='#6B7280')
+    
+    ax.set_xlim(-0.02, columns * (1 + gap_x) - gap_x + 0.02)
+    ax.set_ylim(panel_y.min() - 0.3, 1.35)
+    ax.set_axis_off()
+    
+    return _finish_chart(fig, save_path)
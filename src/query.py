@@ -0,0 +1,201 @@
+"""
+Date-range queries over the habit matrix.
+
+``HabitIndex`` lays the encoded habits out on a continuous calendar (one
+slot per day from the first to the last logged date) and keeps prefix sums
+of completions and of logged days. The completions of any date range are
+then the difference of two prefix rows, so range, rolling-window and
+per-weekday completion rates cost O(1) per habit no matter how long the
+history is. Weekday queries use a second prefix sum that strides by seven
+days, so each weekday's total over a range is also a single subtraction.
+
+Rates follow summarize_habits(): completions divided by the days actually
+logged in the range, so days missing from the sheet don't count as misses.
+
+The index is cached per tracker for as long as the app runs, so it keeps
+the rows themselves bit-packed (analyzer.HabitMatrix) and only unpacks the
+rows of a range when they are asked for. The prefix sums are dense (days x
+habits) and dominate its size; they use the smallest unsigned type that
+holds the row count, and the app's index cache is bounded by bytes
+(see ``nbytes``).
+"""
+import numpy as np
+
+ROLLING_WINDOWS = (7, 30, 90)
+
+WEEKDAYS = ('Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday')
+
+
+def to_day(value):
+    """Convert a 'YYYY-MM-DD' string, date or datetime64 into datetime64[D]; raises ValueError."""
+    return np.datetime64(value, 'D')
+
+
+def _weekday(day):
+    # Day 0 of the datetime64 epoch (1970-01-01) was a Thursday
+    return int((day.astype(np.int64) + 3) % 7)
+
+
+def _strided_cumsum(per_day):
+    """Running totals over days 7 apart: out[d] = per_day[d] + per_day[d - 7] + ..."""
+    n_days = len(per_day)
+    n_weeks = -(-n_days // 7)
+    padded = np.zeros((n_weeks * 7,) + per_day.shape[1:], dtype=per_day.dtype)
+    padded[:n_days] = per_day
+    weeks = padded.reshape((n_weeks, 7) + per_day.shape[1:])
+    return np.cumsum(weeks, axis=0, dtype=per_day.dtype).reshape(padded.shape)[:n_days]
+
+
+class HabitIndex:
+    """
+    Prefix-sum index over encoded habits for O(1) date-range queries.
+
+    Dates passed to the query methods are inclusive and may be anything
+    to_day() accepts; None means the first or last logged date. Ranges are
+    clipped to the tracked period.
+    """
+
+    def __init__(self, encoded):
+        from src.analyzer import HabitMatrix
+        
+        self.packed = HabitMatrix.from_encoded(encoded)
+        self.habits = list(encoded.habits)
+        days = np.asarray(encoded.dates, dtype='datetime64[D]')
+        n_habits = len(self.habits)
+
+        if len(days):
+            self.first_date, self.last_date = days.min(), days.max()
+            positions = (days - self.first_date).astype(np.int64)
+            n_days = int(positions.max()) + 1
+        else:
+            self.first_date = self.last_date = None
+            positions = np.zeros(0, dtype=np.int64)
+            n_days = 0
+        self.n_days = n_days
+
+        # Counts never exceed the number of rows, so the smallest unsigned type
+        # that holds it keeps cached indexes small (uint16 up to 179 years)
+        dtype = np.min_scalar_type(len(positions))
+
+        # Completions and logged rows per calendar day; validated habits have
+        # one row per date, otherwise duplicate dates add up
+        per_day = np.zeros((n_days, n_habits), dtype=dtype)
+        if np.all(positions[1:] > positions[:-1]):
+            per_day[positions] = encoded.matrix
+        else:
+            np.add.at(per_day, positions, np.asarray(encoded.matrix, dtype=dtype))
+        logged = np.bincount(positions, minlength=n_days).astype(dtype)
+
+        self._done = np.zeros((n_days + 1, n_habits), dtype=dtype)
+        np.cumsum(per_day, axis=0, out=self._done[1:])
+        self._logged = np.zeros(n_days + 1, dtype=dtype)
+        np.cumsum(logged, out=self._logged[1:])
+
+        self._done_stride7 = _strided_cumsum(per_day)
+        self._logged_stride7 = _strided_cumsum(logged)
+
+    @property
+    def nbytes(self):
+        """Memory held by the index: the prefix sums plus the bit-packed rows."""
+        prefixes = (self._done, self._logged, self._done_stride7, self._logged_stride7)
+        return sum(array.nbytes for array in prefixes) + self.packed.nbytes
+
+    def _bounds(self, start=None, end=None):
+        """Calendar slots [i, j) covered by the inclusive date range."""
+        if self.n_days == 0:
+            return 0, 0
+        i = 0 if start is None else int((to_day(start) - self.first_date).astype(np.int64))
+        j = self.n_days if end is None else int((to_day(end) - self.first_date).astype(np.int64)) + 1
+        i = min(max(i, 0), self.n_days)
+        return i, max(i, min(j, self.n_days))
+
+    def date_range(self, start=None, end=None):
+        """The (first, last) calendar dates of the clipped range, or None when it is empty."""
+        i, j = self._bounds(start, end)
+        if i == j:
+            return None
+        return self.first_date + i, self.first_date + (j - 1)
+
+    def row_bounds(self, start=None, end=None):
+        """Slice of encoded.matrix rows (sorted by date) that fall in the range."""
+        i, j = self._bounds(start, end)
+        return int(self._logged[i]), int(self._logged[j])
+    
+    def rows(self, start=None, end=None):
+        """The encoded habits logged in the range, or None when there are none."""
+        lo, hi = self.row_bounds(start, end)
+        if lo == hi:
+            return None
+        return self.packed.rows(lo, hi)
+
+    def counts(self, start=None, end=None):
+        """Completions per habit and the number of logged days in the range."""
+        i, j = self._bounds(start, end)
+        return self._done[j] - self._done[i], int(self._logged[j] - self._logged[i])
+
+    def completion_rates(self, start=None, end=None):
+        """
+        Completion rate of each habit over the range, as summarize_habits() would
+        report for just those rows; empty when nothing was logged in the range.
+        """
+        done, logged = self.counts(start, end)
+        if logged == 0:
+            return {}
+        return {habit: round(rate * 100, 2) for habit, rate in zip(self.habits, done / logged)}
+
+    def rolling_rates(self, window, end=None):
+        """Completion rates over the ``window`` calendar days ending at ``end`` (default: the last date)."""
+        if self.n_days == 0:
+            return {}
+        end = self.last_date if end is None else to_day(end)
+        return self.completion_rates(end - (window - 1), end)
+
+    def rolling_series(self, window):
+        """
+        Rolling ``window``-day completion rate (0-100) of every habit on every
+        calendar day, as an (n_days, n_habits) float array; NaN where no days
+        were logged in the window.
+        """
+        stop = np.arange(1, self.n_days + 1)
+        begin = np.maximum(stop - window, 0)
+        done = self._done[stop] - self._done[begin]
+        logged = (self._logged[stop] - self._logged[begin])[:, None]
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return np.where(logged > 0, done * 100.0 / logged, np.nan)
+
+    def _weekday_totals(self, stride7, i, j):
+        """Sum of ``stride7``'s per-day values over slots [i, j), split by slot residue mod 7."""
+        residues = np.arange(7)
+        first = i + (residues - i) % 7               # First slot of each residue in range
+        last = (j - 1) - ((j - 1 - residues) % 7)    # Last slot of each residue in range
+        present = first <= last
+        totals = np.zeros((7,) + stride7.shape[1:], dtype=np.int64)
+        if present.any():
+            upper = stride7[last[present]]
+            before = first[present] - 7
+            lower = np.where((before >= 0).reshape((-1,) + (1,) * (stride7.ndim - 1)),
+                             stride7[np.maximum(before, 0)], 0)
+            totals[present] = upper - lower
+        return totals
+
+    def weekday_rates(self, start=None, end=None):
+        """
+        Completion rate of each habit per day of the week over the range.
+
+        Returns a dict of habit -> {weekday name: rate}, with None for weekdays
+        that have no logged days in the range.
+        """
+        i, j = self._bounds(start, end)
+        if i == j:
+            return {}
+        done = self._weekday_totals(self._done_stride7, i, j)
+        logged = self._weekday_totals(self._logged_stride7, i, j)
+
+        # Slot residue r falls on weekday (weekday of the first date + r) % 7
+        order = [(weekday - _weekday(self.first_date)) % 7 for weekday in range(7)]
+        rates = {habit: {} for habit in self.habits}
+        for weekday, residue in enumerate(order):
+            for h, habit in enumerate(self.habits):
+                rate = round(done[residue, h] / logged[residue] * 100, 2) if logged[residue] else None
+                rates[habit][WEEKDAYS[weekday]] = rate
+        return rates
@@ -0,0 +1,213 @@
+"""
+Background dashboard refresh for the web app.
+
+A RefreshWorker thread regenerates trackers off the request path: it runs
+``scripts/generate_dashboard.py`` for one tracker at a time in a child
+process, so syncing, pandas and matplotlib never run inside (or hold the GIL
+of) a web worker. The generator swaps the new snapshot in atomically (a new
+habit store generation, precomputed stats sidecar, charts and finally the
+manifest), so requests keep serving the previous snapshot until the new one
+is complete and pick it up on their next manifest check.
+
+Requests follow stale-while-revalidate: a page whose snapshot is older than
+the refresh interval is served as is and queues a refresh. The worker also
+wakes up every interval to refresh stale trackers nobody asked for, and
+``POST /api/refresh`` queues one on demand.
+
+With several gunicorn workers each has its own RefreshWorker; a lock file
+per tracker makes sure only one of them regenerates a tracker at a time,
+and a snapshot that just got refreshed is no longer stale for the others.
+"""
+import os
+import sys
+import time
+import threading
+import subprocess
+from datetime import datetime
+
+from src.trackers import tracker_paths, list_trackers
+from src.manifest import manifest_path
+
+GENERATOR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                         'scripts', 'generate_dashboard.py')
+
+# Seconds a single tracker refresh may take before it is abandoned
+REFRESH_TIMEOUT = 600
+
+# Name used for the default tracker in REFRESH_SOURCE patterns
+DEFAULT_TRACKER_NAME = 'default'
+
+
+def snapshot_age(paths):
+    """Seconds since the tracker's manifest was last written, or None without one."""
+    try:
+        return max(0.0, time.time() - os.path.getmtime(manifest_path(paths)))
+    except OSError:
+        return None
+
+
+class RefreshWorker:
+    """
+    Thread that refreshes trackers in the background.
+
+    Parameters:
+    -----------
+    output_dir : str
+        The deployment's output directory
+    source : str
+        Where new rows come from: a CSV export of the sheet, or 'sheets' to
+        sync from Google Sheets. ``{tracker}`` is replaced by the tracker id
+        ('default' for the default tracker), in the CSV path or in ``sheet``
+    interval : float, optional
+        Seconds after which a snapshot is stale; 0 only refreshes on demand
+    sheet : str, optional
+        Name of the Google spreadsheet when ``source`` is 'sheets'
+    """
+
+    def __init__(self, output_dir, source, interval=0, sheet="Habit Tracker"):
+        self.output_dir = output_dir
+        self.source = source
+        self.interval = interval
+        self.sheet = sheet
+        self._queue = []  # Tracker ids waiting for a refresh, oldest first
+        self._status = {}
+        self._attempted = {}  # Tracker id -> time.monotonic() of its last refresh attempt
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+
+    def start(self):
+        """Start the worker thread (once per process; safe to call on every request)."""
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='habit-refresh', daemon=True)
+                self._thread.start()
+
+    def command(self, tracker_id):
+        """The generator command line that refreshes ``tracker_id``."""
+        name = tracker_id or DEFAULT_TRACKER_NAME
+        command = [sys.executable, GENERATOR]
+        if tracker_id is not None:
+            command += ['--tracker', tracker_id]
+        if self.source == 'sheets':
+            command += ['--sheet', self.sheet.replace('{tracker}', name)]
+        else:
+            command += ['--offline', self.source.replace('{tracker}', name)]
+        return command
+
+    def status(self, tracker_id):
+        """The refresh state of a tracker as a JSON-serializable dict."""
+        paths = tracker_paths(self.output_dir, tracker_id)
+        with self._lock:
+            status = dict(self._status.get(tracker_id, {'state': 'idle'}))
+        age = snapshot_age(paths)
+        status['snapshot_age'] = None if age is None else round(age, 1)
+        status['stale'] = self.is_stale(paths)
+        return status
+
+    def request(self, tracker_id, force=True):
+        """
+        Queue a refresh of ``tracker_id`` unless one is already queued or running;
+        returns its status. Without ``force`` the refresh is skipped if the
+        snapshot is no longer stale by the time it runs.
+        """
+        self.start()
+        with self._lock:
+            status = self._status.setdefault(tracker_id, {'state': 'idle'})
+            if status['state'] == 'idle':
+                status.update(state='queued', queued_at=datetime.now().isoformat(timespec='seconds'), force=force)
+                self._queue.append(tracker_id)
+                self._wake.set()
+            elif force:
+                status['force'] = True
+        return self.status(tracker_id)
+
+    def is_stale(self, paths):
+        """Whether a tracker's snapshot is older than the refresh interval (or missing)."""
+        if not self.interval:
+            return False
+        age = snapshot_age(paths)
+        return age is None or age >= self.interval
+
+    def refresh_if_stale(self, tracker_id, paths):
+        """
+        Queue a refresh when the snapshot is stale; never waits for it. A tracker
+        whose refresh keeps failing is retried at most once per interval.
+        """
+        last_attempt = self._attempted.get(tracker_id)
+        if last_attempt is not None and time.monotonic() - last_attempt < self.interval:
+            return
+        if self.is_stale(paths):
+            self.request(tracker_id, force=False)
+
+    def _run(self):
+        while True:
+            woken = self._wake.wait(self.interval or None)
+            self._wake.clear()
+            if not woken:
+                # Nobody asked, but the interval is up: refresh whatever went stale
+                for tracker_id in [None] + list_trackers(self.output_dir):
+                    self.refresh_if_stale(tracker_id, tracker_paths(self.output_dir, tracker_id))
+            while True:
+                with self._lock:
+                    if not self._queue:
+                        break
+                    tracker_id = self._queue.pop(0)
+                    self._status[tracker_id]['state'] = 'running'
+                    force = self._status[tracker_id].get('force', True)
+                self._refresh(tracker_id, force)
+
+    def _refresh(self, tracker_id, force):
+        paths = tracker_paths(self.output_dir, tracker_id)
+        started = time.perf_counter()
+        result = {'last_started': datetime.now().isoformat(timespec='seconds')}
+        try:
+            with _TrackerLock(os.path.join(paths.root, '.refresh.lock')) as locked:
+                if not locked:
+                    result['last_result'] = 'skipped: another worker is refreshing this tracker'
+                elif not force and not self.is_stale(paths):
+                    result['last_result'] = 'skipped: already fresh'
+                else:
+                    completed = subprocess.run(self.command(tracker_id), capture_output=True, text=True,
+                                               timeout=REFRESH_TIMEOUT)
+                    if completed.returncode == 0:
+                        result['last_result'] = 'ok'
+                    else:
+                        lines = (completed.stderr or completed.stdout).strip().splitlines()
+                        result['last_result'] = f"failed: {lines[-1] if lines else completed.returncode}"
+        except Exception as e:
+            result['last_result'] = f"failed: {type(e).__name__}: {e}"
+        result['last_seconds'] = round(time.perf_counter() - started, 2)
+        if result['last_result'] != 'ok':
+            print(f"Refresh of tracker {tracker_id or DEFAULT_TRACKER_NAME} {result['last_result']}")
+        with self._lock:
+            self._status[tracker_id] = dict(result, state='idle')
+            self._attempted[tracker_id] = time.monotonic()
+
+
+class _TrackerLock:
+    """Non-blocking exclusive lock file; the context value says whether it was acquired."""
+
+    def __init__(self, path):
+        self.path = path
+        self._file = None
+
+    def __enter__(self):
+        try:
+            import fcntl
+        except ImportError:
+            return True  # No flock (Windows): a single local worker is assumed
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        self._file = open(self.path, 'a')
+        try:
+            fcntl.flock(self._file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            self._file.close()
+            self._file = None
+            return False
+        return True
+
+    def __exit__(self, *exc_info):
+        if self._file is not None:
+            self._file.close()  # Closing releases the lock
+        return False
@@ -0,0 +1,153 @@
+"""
+Chart rendering pipeline.
+
+Charts are independent of each other, so they are drawn concurrently in a
+process pool (matplotlib's Agg renderer holds the GIL, so threads would not
+help). Each worker imports matplotlib once and builds every chart from the
+shared pre-styled template in ``src.plotting``, so adding chart types adds
+work for the pool rather than wall-clock time for the caller.
+
+Renders are also content addressed: a chart's key hashes the encoded habit
+matrix together with everything that affects how it is drawn, and finished
+images are kept in a cache directory under that key. When the data has not
+changed the existing image is reused and no matplotlib work happens at all.
+"""
+import os
+import json
+import time
+import shutil
+import hashlib
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+
+# Bump whenever chart code changes in a way that should invalidate cached renders
+RENDER_VERSION = 2
+
+# One chart: its type, output path, render time in seconds (0 when it came
+# from the cache), content key and whether it was served from the cache
+RenderResult = namedtuple('RenderResult', ['chart_type', 'path', 'seconds', 'key', 'cached'])
+
+
+def _chart_functions():
+    from src import plotting
+    return {
+        'habit_completion': plotting.plot_completion_rates,
+        'habit_trends': plotting.plot_habit_trends,
+        'habit_calendar': plotting.plot_habit_calendar,
+        'habit_small_multiples': plotting.plot_habit_small_multiples,
+    }
+
+
+def chart_types():
+    """Names of the charts the pipeline can render, in the order the dashboard shows them."""
+    return list(_chart_functions())
+
+
+def render_key(chart_type, encoded):
+    """
+    Content hash identifying a chart of this data.
+
+    Covers the habit names, dates and matrix plus the chart type, render
+    version and shared style, but nothing about the host or file paths, so
+    identical data produces the same key in every environment.
+    """
+    import numpy as np
+    from src.analyzer import CHART_STYLE, HABIT_COLORS
+
+    digest = hashlib.sha256()
+    params = {
+        'chart_type': chart_type,
+        'version': RENDER_VERSION,
+        'habits': list(encoded.habits),
+        'style': CHART_STYLE,
+        'colors': HABIT_COLORS,
+        'shape': list(encoded.matrix.shape)
+    }
+    digest.update(json.dumps(params, sort_keys=True).encode('utf-8'))
+    digest.update(np.ascontiguousarray(encoded.dates, dtype='datetime64[D]').tobytes())
+    digest.update(np.ascontiguousarray(encoded.matrix, dtype=np.uint8).tobytes())
+    return digest.hexdigest()
+
+
+def cached_render_path(cache_dir, key):
+    """Where the render with content key ``key`` lives in ``cache_dir``."""
+    return os.path.join(cache_dir, f'{key}.png')
+
+
+def _copy_atomic(source, target):
+    tmp_path = f'{target}.{os.getpid()}.tmp'
+    shutil.copyfile(source, tmp_path)
+    os.replace(tmp_path, target)
+
+
+def render_chart(chart_type, encoded, save_path, key=None):
+    """Render a single chart to ``save_path`` and time it."""
+    plot = _chart_functions()[chart_type]
+    start = time.perf_counter()
+    # Render next to the target and swap it in, so a chart being served is never half written
+    root, ext = os.path.splitext(save_path)
+    tmp_path = f'{root}.{os.getpid()}.tmp{ext}'
+    plot(None, save_path=tmp_path, encoded=encoded)
+    os.replace(tmp_path, save_path)
+    return RenderResult(chart_type, save_path, time.perf_counter() - start, key, False)
+
+
+def _warm_up():
+    # Pay the matplotlib import and font cache cost once per worker
+    _chart_functions()
+
+
+def render_charts(encoded, jobs, max_workers=None, cache_dir=None):
+    """
+    Render several charts of the same data, concurrently when worthwhile.
+
+    With ``cache_dir``, charts whose content key is already cached are copied
+    from the cache instead of being drawn, and new renders are added to it.
+
+    Parameters:
+    -----------
+    encoded : EncodedHabits
+        Result of encode_habits(df) shared by every chart
+    jobs : list of (str, str)
+        (chart type, save path) pairs, see chart_types()
+    max_workers : int, optional
+        Size of the process pool; 1 renders in the calling process
+    cache_dir : str, optional
+        Directory of content-addressed renders to reuse and fill
+
+    Returns:
+    --------
+    list of RenderResult
+        One result per job, in job order
+    """
+    results = {}
+    pending = []
+    for index, (chart_type, path) in enumerate(jobs):
+        key = render_key(chart_type, encoded) if cache_dir else None
+        cached_path = cached_render_path(cache_dir, key) if key else None
+        if cached_path and os.path.exists(cached_path):
+            if os.path.abspath(path) != os.path.abspath(cached_path):
+                _copy_atomic(cached_path, path)
+            results[index] = RenderResult(chart_type, path, 0.0, key, True)
+        else:
+            pending.append((index, chart_type, path, key))
+
+    if max_workers is None:
+        max_workers = min(len(pending), os.cpu_count() or 1)
+
+    if max_workers <= 1 or len(pending) <= 1:
+        for index, chart_type, path, key in pending:
+            results[index] = render_chart(chart_type, encoded, path, key)
+    else:
+        with ProcessPoolExecutor(max_workers=max_workers, initializer=_warm_up) as pool:
+            futures = {index: pool.submit(render_chart, chart_type, encoded, path, key)
+                       for index, chart_type, path, key in pending}
+            for index, future in futures.items():
+                results[index] = future.result()
+
+    if cache_dir:
+        os.makedirs(cache_dir, exist_ok=True)
+        for index, chart_type, path, key in pending:
+            _copy_atomic(path, cached_render_path(cache_dir, key))
+
+    return [results[index] for index in range(len(jobs))]
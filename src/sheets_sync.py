@@ -0,0 +1,215 @@
+"""
+Delta sync of the habit worksheet into a single local CSV store.
+
+Instead of downloading every row with ``get_all_records()`` on each run,
+the sync remembers how many sheet rows it has already stored and fetches
+only the rows below them with one ranged ``batch_get`` call. That call also
+re-reads the header and the last few synced rows; if their checksum no
+longer matches, an earlier row was edited or removed and the whole sheet is
+resynced instead. Rows inserted or removed further up shift the window and
+are caught the same way; an in-place edit above it needs ``full=True``
+(``--full-resync``).
+
+Any object with gspread's ``get_all_values()`` and ``batch_get(ranges)``
+methods can be synced, e.g. ``CsvWorksheet`` for offline runs.
+"""
+import os
+import re
+import csv
+import json
+import hashlib
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+
+from src.validation import parse_dates
+
+SYNC_VERSION = 3
+
+# Number of already-synced rows re-read on each delta sync to detect edits
+DEFAULT_OVERLAP = 7
+
+# mode is 'full', 'delta' or 'unchanged'; new_rows holds the rows just stored
+# and sheet_rows is how many sheet rows (below the header) are now synced
+SyncResult = namedtuple('SyncResult', ['mode', 'new_rows', 'sheet_rows'])
+
+
+def column_letter(index):
+    """Convert a 1-based column index into A1 notation letters (1 -> A, 27 -> AA)."""
+    letters = ''
+    while index > 0:
+        index, remainder = divmod(index - 1, 26)
+        letters = chr(65 + remainder) + letters
+    return letters
+
+
+def sync_meta_path(csv_path):
+    """Return the path of the file that records what has been synced."""
+    root, _ = os.path.splitext(csv_path)
+    return f'{root}.sync.json'
+
+
+def _checksum(rows):
+    return hashlib.sha1(json.dumps(rows).encode('utf-8')).hexdigest()
+
+
+def _clean_header(header):
+    # The Sheets API drops trailing empty cells, but be lenient with exports
+    header = list(header)
+    while header and header[-1] == '':
+        header.pop()
+    return header
+
+
+def _pad(rows, width):
+    """Give every row exactly ``width`` cells (the API omits trailing blanks)."""
+    return [(list(row) + [''] * width)[:width] for row in rows]
+
+
+def _rows_to_frame(header, rows):
+    """
+    Convert raw sheet rows into a DataFrame with ISO dates, dropping blank rows.
+    Dates that can't be parsed are kept as typed; validation reports and skips them.
+    """
+    df = pd.DataFrame(rows, columns=header)
+    df = df[df['Date'].astype(str).str.strip() != '']
+    dates = parse_dates(df['Date'])
+    df['Date'] = np.where(np.isnat(dates), df['Date'].astype(str), np.datetime_as_string(dates, unit='D'))
+    return df
+
+
+def _load_meta(csv_path):
+    try:
+        with open(sync_meta_path(csv_path), 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if meta.get('version') != SYNC_VERSION or not os.path.exists(csv_path):
+        return None
+    return meta
+
+
+def _save_meta(csv_path, header, synced_rows, overlap_rows):
+    meta = {
+        'version': SYNC_VERSION,
+        'header': header,
+        'synced_rows': synced_rows,
+        'overlap_checksum': _checksum(overlap_rows)
+    }
+    target = sync_meta_path(csv_path)
+    tmp_path = f'{target}.{os.getpid()}.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(meta, f)
+    os.replace(tmp_path, target)
+
+
+def _last_rows(rows, overlap):
+    return rows[len(rows) - min(overlap, len(rows)):]
+
+
+def full_sync(worksheet, csv_path, overlap=DEFAULT_OVERLAP):
+    """Download the whole worksheet and rewrite the local store from it."""
+    values = worksheet.get_all_values()
+    if not values:
+        return SyncResult('full', pd.DataFrame(), 0)
+    header = _clean_header(values[0])
+    rows = _pad(values[1:], len(header))
+
+    df = _rows_to_frame(header, rows).sort_values('Date', kind='stable')
+    tmp_path = f'{csv_path}.{os.getpid()}.tmp'
+    df.to_csv(tmp_path, index=False)
+    os.replace(tmp_path, csv_path)
+
+    _save_meta(csv_path, header, len(rows), _last_rows(rows, overlap))
+    return SyncResult('full', df, len(rows))
+
+
+def sync_worksheet(worksheet, csv_path, overlap=DEFAULT_OVERLAP, full=False):
+    """
+    Bring the local CSV store up to date with the worksheet.
+
+    Parameters:
+    -----------
+    worksheet : gspread.Worksheet or compatible object
+        Needs get_all_values() and batch_get(ranges)
+    csv_path : str
+        Path of the canonical local CSV store
+    overlap : int, optional
+        Number of already-synced rows to re-read and checksum for edits
+    full : bool, optional
+        Force a full resync
+
+    Returns:
+    --------
+    SyncResult
+        The sync mode, the rows written by this sync and the synced sheet row count
+    """
+    meta = None if full else _load_meta(csv_path)
+    if meta is None:
+        return full_sync(worksheet, csv_path, overlap)
+
+    header = meta['header']
+    synced_rows = meta['synced_rows']
+    overlap_rows = min(overlap, synced_rows)
+    last_column = column_letter(len(header))
+
+    # One round trip: the header (one column wider, to see an appended column)
+    # plus everything from the overlap window down
+    first_row = synced_rows - overlap_rows + 2  # Sheet rows are 1-based, row 1 is the header
+    header_values, tail_values = worksheet.batch_get([
+        f'A1:{column_letter(len(header) + 1)}1',
+        f'A{first_row}:{last_column}'
+    ])
+    current_header = _clean_header(header_values[0]) if header_values else []
+    tail_rows = _pad(tail_values, len(header))
+
+    if (current_header != header or len(tail_rows) < overlap_rows
+            or _checksum(tail_rows[:overlap_rows]) != meta['overlap_checksum']):
+        # Columns changed or an already-synced row was edited or removed
+        print("Synced rows changed in the sheet, running a full resync")
+        return full_sync(worksheet, csv_path, overlap)
+
+    new_rows = tail_rows[overlap_rows:]
+    if not new_rows:
+        return SyncResult('unchanged', pd.DataFrame(columns=header), synced_rows)
+
+    df = _rows_to_frame(header, new_rows)
+    df.to_csv(csv_path, mode='a', header=False, index=False)
+    sheet_rows = synced_rows + len(new_rows)
+    _save_meta(csv_path, header, sheet_rows, _last_rows(tail_rows, overlap))
+    return SyncResult('delta', df, sheet_rows)
+
+
+class CsvWorksheet:
+    """
+    Minimal stand-in for a gspread worksheet backed by a local CSV export.
+
+    Supports the two calls the sync makes, so it can be run offline against
+    a downloaded copy of the sheet.
+    """
+
+    _RANGE = re.compile(r'^([A-Z]+)(\d+):([A-Z]+)(\d*)$')
+
+    def __init__(self, path):
+        self.path = path
+
+    def _read(self):
+        with open(self.path, 'r', newline='', encoding='utf-8') as f:
+            return [row for row in csv.reader(f)]
+
+    def get_all_values(self):
+        return self._read()
+
+    def batch_get(self, ranges):
+        values = self._read()
+        results = []
+        for range_name in ranges:
+            match = self._RANGE.match(range_name)
+            if match is None:
+                raise ValueError(f"Unsupported range: {range_name}")
+            _, first_row, last_col, last_row = match.groups()
+            width = sum((ord(c) - 64) * 26 ** i for i, c in enumerate(reversed(last_col)))
+            stop = int(last_row) if last_row else len(values)
+            results.append([row[:width] for row in values[int(first_row) - 1:stop]])
+        return results
@@ -0,0 +1,397 @@
+"""
+Snapshot cache for the dashboard summary statistics.
+
+The habit data only changes when ``generate_dashboard.py`` runs, so the
+fully computed ``summary_stats`` dict is stored in a JSON sidecar next to
+each CSV (``habit_data_<date>.stats.json``). The sidecar is keyed by the
+CSV's (path, mtime, size), which means a newer or rewritten CSV invalidates
+it automatically, and because it lives on disk every gunicorn worker can
+reuse a snapshot computed by any other worker or by the generator script.
+The chart series served to the browser are cached the same way
+(``habit_data_<date>.series.json``).
+
+The in-process layer is a bounded LRU so a worker serving many trackers
+keeps only the recently used ones in memory; evicted snapshots are reloaded
+from their sidecars on the next request.
+"""
+import os
+import json
+import hashlib
+import threading
+from collections import OrderedDict
+
+from src.instrumentation import span, count_cache
+
+# Bump whenever the shape of a cached value changes so old sidecars are ignored
+CACHE_VERSION = 7
+
+# Trackers with more habits get only the strongest pairs, not the full
+# habit x habit correlation matrices (which a heatmap couldn't show anyway)
+HEATMAP_MAX_HABITS = 20
+
+# How many trackers' snapshots each process keeps in memory
+MAX_CACHED_TRACKERS = int(os.environ.get('MAX_CACHED_TRACKERS', 64))
+
+# Memory each process may spend on date-range query indexes (MB)
+MAX_INDEX_CACHE_MB = int(os.environ.get('MAX_INDEX_CACHE_MB', 256))
+
+
+class LRUCache:
+    """
+    A thread-safe mapping that drops the least recently used entry when full.
+
+    With ``maxbytes``, entries are also dropped while the ``sizeof(value)``
+    of all entries adds up to more than that (the newest entry is always kept).
+    """
+
+    def __init__(self, maxsize, maxbytes=None, sizeof=None):
+        self.maxsize = maxsize
+        self.maxbytes = maxbytes
+        self._sizeof = sizeof
+        self._sizes = {}
+        self.nbytes = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            if key not in self._entries:
+                return default
+            self._entries.move_to_end(key)
+            return self._entries[key]
+
+    def __setitem__(self, key, value):
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            if self._sizeof is not None:
+                size = self._sizeof(value)
+                self.nbytes += size - self._sizes.get(key, 0)
+                self._sizes[key] = size
+            while len(self._entries) > self.maxsize or \
+                    (self.maxbytes is not None and self.nbytes > self.maxbytes and len(self._entries) > 1):
+                oldest, _ = self._entries.popitem(last=False)
+                self.nbytes -= self._sizes.pop(oldest, 0)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._sizes.clear()
+            self.nbytes = 0
+
+
+# In-process layer in front of the sidecar files: (path, kind) -> (key, value)
+_memory_cache = LRUCache(2 * MAX_CACHED_TRACKERS)  # stats and series per tracker
+# Serialized chart series responses: path -> (key, payload)
+_payload_cache = LRUCache(MAX_CACHED_TRACKERS)
+# Date-range query indexes: path -> (key, HabitIndex), bounded by their size
+# since a long, wide tracker's index takes megabytes
+_index_cache = LRUCache(MAX_CACHED_TRACKERS, maxbytes=MAX_INDEX_CACHE_MB * 2**20,
+                        sizeof=lambda entry: entry[1].nbytes)
+
+
+def sidecar_path(csv_path, kind='stats'):
+    """Return the path of the ``kind`` JSON sidecar that belongs to ``csv_path``."""
+    root, _ = os.path.splitext(csv_path)
+    return f'{root}.{kind}.json'
+
+
+def cache_key(csv_path):
+    """Identify a CSV snapshot (or habit store) by its absolute path, mtime and size."""
+    if os.path.isdir(csv_path):
+        # A habit store changes exactly when its meta.json is replaced
+        stat = os.stat(os.path.join(csv_path, 'meta.json'))
+    else:
+        stat = os.stat(csv_path)
+    return [os.path.abspath(csv_path), stat.st_mtime_ns, stat.st_size]
+
+
+def _to_builtin(value):
+    """Recursively convert NumPy scalars into plain Python values for JSON."""
+    if isinstance(value, dict):
+        return {str(k): _to_builtin(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_to_builtin(v) for v in value]
+    if hasattr(value, 'item') and not isinstance(value, (str, bytes)):
+        return value.item()
+    return value
+
+
+def compute_summary_stats(df, detailed_stats=None):
+    """
+    Build the ``summary_stats`` dict rendered by the dashboard template.
+
+    Parameters:
+    -----------
+    df : pandas.DataFrame
+        DataFrame containing the habit tracking data as read from CSV
+    detailed_stats : dict, optional
+        Already computed detailed statistics (e.g. from HabitStatsState)
+
+    Returns:
+    --------
+    dict or None
+        Totals, date range, completion rates and detailed statistics; None
+        when no row passed validation
+    """
+    from src.analyzer import encode_habits
+    from src.validation import ValidationReport
+
+    # Validate and encode the Yes/No columns once and share the matrix with every stat
+    report = ValidationReport()
+    encoded = encode_habits(df, report=report)
+    return _validated_summary(encoded, detailed_stats, report.to_dict(encoded.dates))
+
+
+def compute_store_summary_stats(store_dir, detailed_stats=None):
+    """Build the ``summary_stats`` dict from a memory-mapped habit store."""
+    from src.analyzer import load_store, read_store_meta
+
+    encoded = load_store(store_dir)
+    validation = read_store_meta(store_dir).get('validation')
+    return _validated_summary(encoded, detailed_stats, validation)
+
+
+def _validated_summary(encoded, detailed_stats=None, validation=None):
+    """The ``summary_stats`` of validated habits, or None when no row passed validation."""
+    if not len(encoded.dates):
+        return None
+    return _summary_from_encoded(encoded, len(encoded.habits), _date_range(encoded), detailed_stats,
+                                 validation=validation)
+
+
+def _date_range(encoded):
+    """'Month Day, Year to Month Day, Year' of validated habits (rows in date order)."""
+    import pandas as pd
+
+    start_date, end_date = pd.DatetimeIndex(encoded.dates[[0, -1]]).strftime('%B %d, %Y')
+    return f"{start_date} to {end_date}"
+
+
+def _summary_from_encoded(encoded, total_habits, date_range, detailed_stats=None, index=None, start=None, end=None,
+                          validation=None):
+    from src.analyzer import get_detailed_stats, get_correlation_stats
+    from src.query import HabitIndex, ROLLING_WINDOWS
+
+    # Rates come from the prefix-sum index: O(1) per habit for any date range
+    if index is None:
+        index = HabitIndex(encoded)
+    completion_rates = index.completion_rates(start, end)
+
+    overall_rate = round(sum(completion_rates.values()) / len(completion_rates) if completion_rates else 0, 2)
+
+    if detailed_stats is None:
+        detailed_stats = get_detailed_stats(None, encoded=encoded)
+
+    # Completion over the last 7/30/90 days of the period, per habit
+    rolling = {window: index.rolling_rates(window, end) for window in ROLLING_WINDOWS}
+    rolling_rates = {habit: {str(window): rolling[window].get(habit) for window in ROLLING_WINDOWS}
+                     for habit in completion_rates}
+
+    # How habits go together; the pair matrices are only kept while a heatmap of them stays readable
+    correlations = get_correlation_stats(encoded)
+    if len(encoded.habits) > HEATMAP_MAX_HABITS:
+        correlations = {key: correlations[key] for key in ('habits', 'days', 'top_pairs')}
+
+    return {
+        'total_habits': total_habits,
+        'date_range': date_range,
+        'overall_rate': overall_rate,
+        'habit_rates': completion_rates,
+        'rolling_rates': rolling_rates,
+        'weekday_rates': index.weekday_rates(start, end),
+        'correlations': correlations,
+        'detailed_stats': detailed_stats,
+        'data_quality': validation
+    }
+
+
+def load_encoded(csv_path):
+    """Encode the habits of a CSV snapshot, or memory-map them from a habit store."""
+    from src.analyzer import load_store, stream_csv
+
+    if os.path.isdir(csv_path):
+        return load_store(csv_path)
+    # Streamed in chunks without the Notes column
+    with span('read_csv'):
+        return stream_csv(csv_path).encoded
+
+
+def read_sidecar(csv_path, key, kind='stats'):
+    """Return the cached ``kind`` value for ``csv_path`` if the sidecar matches ``key``."""
+    try:
+        with open(sidecar_path(csv_path, kind), 'r', encoding='utf-8') as f:
+            payload = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if payload.get('version') != CACHE_VERSION or payload.get('key') != key:
+        return None
+    return payload.get('value')
+
+
+def write_sidecar(csv_path, key, value, kind='stats'):
+    """Atomically write a sidecar so readers never see a partial file."""
+    target = sidecar_path(csv_path, kind)
+    tmp_path = f'{target}.{os.getpid()}.{threading.get_ident()}.tmp'
+    payload = {
+        'version': CACHE_VERSION,
+        'key': key,
+        'value': value
+    }
+    try:
+        # json.dumps encodes in C; json.dump streams through the pure-Python encoder
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(json.dumps(payload))
+        os.replace(tmp_path, target)
+    except OSError as e:
+        # A read-only data directory shouldn't break the page, just the caching
+        print(f"Could not write {kind} cache for {csv_path}: {e}")
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def _get_cached(csv_path, kind, compute):
+    """Memory, then sidecar, then ``compute()``; whatever is computed is cached in both."""
+    key = cache_key(csv_path)
+
+    cached = _memory_cache.get((csv_path, kind))
+    if cached is not None and cached[0] == key:
+        count_cache(kind, 'memory')
+        return cached[1]
+
+    value = read_sidecar(csv_path, key, kind)
+    if value is None:
+        count_cache(kind, 'miss')
+        with span(f'compute_{kind}'):
+            value = _to_builtin(compute())
+        write_sidecar(csv_path, key, value, kind)
+    else:
+        count_cache(kind, 'disk')
+
+    _memory_cache[(csv_path, kind)] = (key, value)
+    return value
+
+
+def get_summary_stats(csv_path, detailed_stats=None):
+    """
+    Return the summary statistics for ``csv_path``, computing them only once.
+
+    ``csv_path`` may also be a habit store directory written by write_store().
+    Lookup order is the in-process dict, then the on-disk sidecar, and only
+    when both are stale is the data loaded and analysed. Passing
+    ``detailed_stats`` skips get_detailed_stats() when a fresh snapshot is built.
+    """
+    def compute():
+        if os.path.isdir(csv_path):
+            return compute_store_summary_stats(csv_path, detailed_stats)
+        from src.analyzer import stream_csv
+        # Streamed in chunks without the Notes column, like load_encoded()
+        with span('read_csv'):
+            streamed = stream_csv(csv_path)
+        return _validated_summary(streamed.encoded, detailed_stats, streamed.validation)
+
+    return _get_cached(csv_path, 'stats', compute)
+
+
+def get_chart_series(csv_path):
+    """Return the chart series (see analyzer.get_chart_series) for ``csv_path``, cached like the stats."""
+    def compute():
+        from src.analyzer import get_chart_series as build_series
+        return build_series(load_encoded(csv_path))
+
+    return _get_cached(csv_path, 'series', compute)
+
+
+def series_etag(csv_path, start=None, end=None):
+    """
+    Strong ETag of the chart series of ``csv_path`` (limited to ``start``..``end``),
+    derived from the snapshot's cache key so a request can be revalidated
+    without building the series.
+    """
+    key = json.dumps([CACHE_VERSION, cache_key(csv_path), start, end], default=str)
+    return hashlib.sha1(key.encode('utf-8')).hexdigest()
+
+
+def _build_payload(series, etag):
+    from src.http_cache import compress_variants
+
+    body = json.dumps(series, separators=(',', ':')).encode('utf-8')
+    return {
+        'etag': etag,
+        'variants': compress_variants(body)
+    }
+
+
+def get_series_payload(csv_path, start=None, end=None):
+    """
+    Return the serialized chart series ready to send: a strong ETag plus the
+    compact JSON body in each content encoding (see
+    src.http_cache.compress_variants), built once per snapshot.
+
+    With ``start``/``end`` the series only cover that date range; those
+    payloads are built per request rather than cached.
+    """
+    if start is not None or end is not None:
+        from src.analyzer import get_chart_series as build_series
+        encoded = get_range_encoded(csv_path, start, end)
+        if encoded is None:
+            return None
+        return _build_payload(_to_builtin(build_series(encoded)), series_etag(csv_path, start, end))
+
+    series = get_chart_series(csv_path)
+    key = cache_key(csv_path)
+
+    cached = _payload_cache.get(csv_path)
+    if cached is not None and cached[0] == key:
+        count_cache('series_payload', 'memory')
+        return cached[1]
+
+    count_cache('series_payload', 'miss')
+    payload = _build_payload(series, series_etag(csv_path))
+    _payload_cache[csv_path] = (key, payload)
+    return payload
+
+
+def get_habit_index(csv_path):
+    """Return the date-range query index (src.query.HabitIndex) of ``csv_path``, kept per snapshot."""
+    from src.query import HabitIndex
+
+    key = cache_key(csv_path)
+    cached = _index_cache.get(csv_path)
+    if cached is not None and cached[0] == key:
+        count_cache('query_index', 'memory')
+        return cached[1]
+
+    count_cache('query_index', 'miss')
+    with span('build_index'):
+        index = HabitIndex(load_encoded(csv_path))
+    _index_cache[csv_path] = (key, index)
+    return index
+
+
+def get_range_encoded(csv_path, start=None, end=None):
+    """The encoded habits of ``csv_path`` logged between ``start`` and ``end`` (inclusive), or None if there are none."""
+    return get_habit_index(csv_path).rows(start, end)
+
+
+def get_range_summary_stats(csv_path, start=None, end=None):
+    """
+    Return the summary statistics of ``csv_path`` restricted to the inclusive
+    date range ``start``..``end`` (either may be None for an open end).
+
+    Completion, rolling and weekday rates are answered from the cached
+    prefix-sum index; only the streak, weekly and consistency statistics are
+    computed over the rows in range. Returns None when nothing was logged in
+    the range.
+    """
+    index = get_habit_index(csv_path)
+    encoded = get_range_encoded(csv_path, start, end)
+    if encoded is None:
+        return None
+
+    first, last = index.date_range(start, end)
+    date_range = f"{first.astype(object).strftime('%B %d, %Y')} to {last.astype(object).strftime('%B %d, %Y')}"
+    return _to_builtin(_summary_from_encoded(encoded, len(encoded.habits), date_range, index=index, start=first, end=last))
@@ -0,0 +1,160 @@
+"""
+Per-tracker data layout.
+
+One deployment can host many habit trackers. The default tracker keeps the
+original layout directly under ``output/`` (``data/``, ``visuals/``); every
+other tracker gets the same layout under ``output/trackers/<tracker_id>/``,
+so each has its own CSV store, habit store, stats sidecars and render cache
+and nothing is shared between tenants.
+"""
+import os
+import re
+import glob
+from collections import namedtuple
+from datetime import datetime
+
+from src.manifest import read_manifest, manifest_data, manifest_visuals, manifest_path
+
+# Tracker ids become directory names and URL segments, so keep them plain
+TRACKER_ID_PATTERN = re.compile(r'^[A-Za-z0-9][A-Za-z0-9_-]{0,63}$')
+
+TRACKERS_DIRNAME = 'trackers'
+
+TrackerPaths = namedtuple('TrackerPaths', ['root', 'data_dir', 'visuals_dir', 'store_dir', 'render_cache_dir'])
+
+
+def is_valid_tracker_id(tracker_id):
+    """Whether ``tracker_id`` is safe to use as a directory name and URL segment."""
+    return bool(TRACKER_ID_PATTERN.match(tracker_id or ''))
+
+
+def tracker_paths(output_dir, tracker_id=None):
+    """
+    Return the directories that belong to a tracker.
+
+    Parameters:
+    -----------
+    output_dir : str
+        The deployment's output directory
+    tracker_id : str, optional
+        Tracker to locate; None is the default tracker stored directly in output_dir
+
+    Returns:
+    --------
+    TrackerPaths
+        Root, data, visuals, habit store and render cache directories
+    """
+    if tracker_id is None:
+        root = output_dir
+    elif is_valid_tracker_id(tracker_id):
+        root = os.path.join(output_dir, TRACKERS_DIRNAME, tracker_id)
+    else:
+        raise ValueError(f"Invalid tracker id: {tracker_id!r}")
+
+    data_dir = os.path.join(root, 'data')
+    visuals_dir = os.path.join(root, 'visuals')
+    return TrackerPaths(root, data_dir, visuals_dir,
+                        os.path.join(data_dir, 'habit_store'),
+                        os.path.join(visuals_dir, 'renders'))
+
+
+def list_trackers(output_dir):
+    """Ids of the non-default trackers that have a data directory."""
+    pattern = os.path.join(output_dir, TRACKERS_DIRNAME, '*', 'data')
+    return sorted(os.path.basename(os.path.dirname(path)) for path in glob.glob(pattern)
+                  if is_valid_tracker_id(os.path.basename(os.path.dirname(path))))
+
+
+def find_latest_data(paths):
+    """
+    Return the path of a tracker's newest data snapshot and its formatted update
+    date. The manifest written by the generator answers this with one stat;
+    without one, prefer the columnar habit store and fall back to the newest CSV.
+    """
+    manifest = read_manifest(paths)
+    if manifest is not None:
+        latest_data, latest_date = manifest_data(paths, manifest)
+        if latest_data:
+            return latest_data, latest_date
+
+    store_meta = os.path.join(paths.store_dir, 'meta.json')
+    if os.path.exists(store_meta):
+        return paths.store_dir, datetime.fromtimestamp(os.path.getmtime(store_meta)).strftime('%B %d, %Y')
+
+    data_files = glob.glob(os.path.join(paths.data_dir, '*.csv'))
+    if not data_files:
+        return None, None
+    # Find the most recent data file
+    latest_data = max(data_files, key=os.path.getmtime)
+    # Get the modification date
+    return latest_data, datetime.fromtimestamp(os.path.getmtime(latest_data)).strftime('%B %d, %Y')
+
+
+def find_latest_visuals(paths):
+    """
+    Return the file names of a tracker's newest chart of each type, from the
+    manifest when there is one and otherwise by scanning the visuals directory.
+    """
+    manifest = read_manifest(paths)
+    if manifest is not None:
+        return manifest_visuals(manifest)
+
+    visual_files = glob.glob(os.path.join(paths.visuals_dir, '*.png'))
+    
+    # Group files by type (remove date from filename to group them)
+    visual_types = {}
+    for file_path in visual_files:
+        base_name = os.path.basename(file_path)
+        if '.tmp' in base_name:
+            continue  # A chart still being rendered
+        # Split by date pattern (assumes format like 'habit_completion_2025-05-08.png')
+        file_parts = base_name.split('_')
+        if len(file_parts) > 1:
+            # Get everything before the date to use as type key
+            file_type = '_'.join(file_parts[:-1])  # e.g., 'habit_completion'
+            # Add to dictionary with creation time as value for sorting
+            if file_type not in visual_types:
+                visual_types[file_type] = []
+            visual_types[file_type].append({
+                'path': file_path,
+                'name': base_name,
+                'time': os.path.getmtime(file_path)
+            })
+    
+    # For each type, only keep the most recent file
+    latest_visuals = []
+    for file_type, files in visual_types.items():
+        # Sort by modification time, newest first
+        sorted_files = sorted(files, key=lambda x: x['time'], reverse=True)
+        if sorted_files:
+            latest_visuals.append(sorted_files[0]['name'])
+    return latest_visuals
+
+
+def visual_version(paths, filename):
+    """
+    Version of the chart ``filename`` to put in its URL, or None if it doesn't
+    exist: the start of its content hash from the manifest, or a stat-based
+    token for charts the manifest doesn't (or no longer) describe.
+    """
+    for directory in (paths.visuals_dir, paths.render_cache_dir):
+        try:
+            stat = os.stat(os.path.join(directory, filename))
+            break
+        except OSError:
+            continue
+    else:
+        return None
+
+    manifest = read_manifest(paths)
+    if manifest is not None:
+        try:
+            manifest_mtime = os.stat(manifest_path(paths)).st_mtime_ns
+        except OSError:
+            manifest_mtime = None
+        # A chart rewritten after the manifest may no longer match its hash
+        if manifest_mtime is not None and stat.st_mtime_ns <= manifest_mtime:
+            for entry in manifest['visuals'].values():
+                if entry['file'] == filename:
+                    return entry['sha256'][:16]
+    return f'{stat.st_mtime_ns:x}-{stat.st_size:x}'
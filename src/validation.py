@@ -0,0 +1,190 @@
+"""
+Validation and normalization of tracker data before any analytics.
+
+Sheets are filled in by hand, so habit cells come in many spellings ('Yes',
+' yes', 'Y', 'TRUE', '1', '✓', ...), days get logged twice or skipped and
+rows may be out of order. Ingestion (encode_habits() and the streaming
+reader in ``src.analyzer``) runs every sheet through this module once: cell
+values are classified per distinct value rather than per cell, dates are
+parsed and truncated to days, and the rows end up in date order with one row
+per day (a day logged again replaces the earlier entry). What was found is
+collected in a ValidationReport and stored with the habit store together with
+the sheet's typed schema, so everything downstream works on the validated
+arrays without checking or re-parsing them.
+
+Completion statistics count the logged days. to_calendar() reindexes them
+onto a continuous daily calendar in which days without a row have the
+explicit NOT_LOGGED state.
+"""
+import numpy as np
+import pandas as pd
+
+# Spellings of a done / not done habit, compared after strip() and lower()
+TRUTHY_VALUES = frozenset(['yes', 'y', 'true', 't', '1', '1.0', 'x', 'done', '✓', '✔', '☑', '✅'])
+FALSY_VALUES = frozenset(['no', 'n', 'false', 'f', '0', '0.0', 'not done', '-', '✗', '✘', '❌'])
+
+# Cells that were left empty, after normalization
+EMPTY_VALUES = frozenset(['', 'nan', 'none'])
+
+# States of a habit on a calendar day (see to_calendar())
+MISSED, DONE, NOT_LOGGED = 0, 1, 2
+
+# Examples listed per kind of problem in a report
+REPORT_SAMPLES = 5
+
+
+def habit_schema(columns):
+    """
+    Typed schema of a tracker sheet: 'date' for the Date column, 'text' for
+    Notes and 'bool' for every habit column, keyed by column name.
+    """
+    return {str(col): 'date' if col == 'Date' else 'text' if col == 'Notes' else 'bool' for col in columns}
+
+
+def classify_values(uniques):
+    """
+    Normalize the distinct raw values found in habit cells.
+
+    Parameters:
+    -----------
+    uniques : sequence
+        Distinct cell values, e.g. from pandas.factorize()
+
+    Returns:
+    --------
+    (numpy.ndarray, numpy.ndarray, numpy.ndarray)
+        Aligned with ``uniques``: uint8 1 for values meaning done, and bool
+        masks of the recognized values and of the empty ones. Unrecognized
+        and empty values count as not done.
+    """
+    normalized = [str(value).strip().lower() for value in uniques]
+    done = np.array([value in TRUTHY_VALUES for value in normalized], dtype=np.uint8)
+    empty = np.array([value in EMPTY_VALUES for value in normalized], dtype=bool)
+    falsy = np.array([value in FALSY_VALUES for value in normalized], dtype=bool)
+    return done, done.astype(bool) | falsy | empty, empty
+
+
+def parse_dates(values):
+    """Parse a Date column into datetime64[ns] days; dates that can't be parsed become NaT."""
+    dates = np.asarray(pd.to_datetime(values, errors='coerce'), dtype='datetime64[ns]')
+    return dates.astype('datetime64[D]').astype('datetime64[ns]')
+
+
+def last_of_each_date(sorted_dates):
+    """Mask keeping the last row of each date in ``sorted_dates``; later entries correct earlier ones."""
+    keep = np.ones(len(sorted_dates), dtype=bool)
+    keep[:-1] = sorted_dates[1:] != sorted_dates[:-1]
+    return keep
+
+
+def _iso_days(dates):
+    return [str(day) for day in np.asarray(dates, dtype='datetime64[D]')]
+
+
+class ValidationReport:
+    """
+    What validation found in a sheet, accumulated over the chunks it is read in.
+
+    Call to_dict() with the validated dates for the JSON-serializable report.
+    """
+
+    def __init__(self):
+        self.rows = 0
+        self.invalid_dates = 0
+        self.duplicate_rows = 0
+        self.duplicate_dates = set()  # ISO days logged more than once
+        self.empty_cells = 0
+        self.unrecognized = {}  # Raw value -> number of cells
+
+    def count_rows(self, rows, invalid_dates):
+        """Count ``rows`` rows read, ``invalid_dates`` of them dropped for an unparseable date."""
+        self.rows += rows
+        self.invalid_dates += invalid_dates
+
+    def count_cells(self, codes, uniques, recognized, empty):
+        """Count the empty and unrecognized cells among factorized ``codes`` (-1 for missing)."""
+        counts = np.bincount(codes[codes >= 0], minlength=len(uniques))
+        self.empty_cells += int((codes < 0).sum() + counts[empty].sum())
+        for i in np.flatnonzero(~recognized & (counts > 0)):
+            value = str(uniques[i])
+            self.unrecognized[value] = self.unrecognized.get(value, 0) + int(counts[i])
+
+    def count_duplicates(self, sorted_dates, keep):
+        """Count the rows dropped by a last_of_each_date() mask."""
+        dropped = sorted_dates[~keep]
+        self.duplicate_rows += len(dropped)
+        self.duplicate_dates.update(_iso_days(np.unique(dropped)))
+
+    def to_dict(self, dates, earlier=None):
+        """
+        The report for the validated (sorted, one per day) ``dates``, including
+        the days missing between the first and the last one.
+
+        ``earlier`` is the to_dict() of rows read before these, all of earlier
+        days (e.g. the rows a habit store already holds): its counts are added
+        in and its examples listed first. Their counts per value aren't kept,
+        so after appending the unrecognized examples are not strictly the
+        most frequent ones.
+        """
+        days = np.asarray(dates, dtype='datetime64[D]')
+        missing = np.zeros(0, dtype='datetime64[D]')
+        if len(days):
+            missing = np.setdiff1d(np.arange(days[0], days[-1] + 1), days, assume_unique=True)
+        unrecognized = sorted(self.unrecognized.items(), key=lambda item: (-item[1], item[0]))
+        unrecognized_values = [value for value, _ in unrecognized]
+        duplicate_dates = sorted(self.duplicate_dates)
+        counts = [self.rows, self.invalid_dates, self.duplicate_rows, self.empty_cells,
+                  sum(self.unrecognized.values())]
+        if earlier is not None:
+            counts = [count + earlier[key] for count, key in zip(counts, (
+                'rows', 'invalid_dates', 'duplicate_rows', 'empty_cells', 'unrecognized_cells'))]
+            duplicate_dates = earlier['duplicate_dates'] + duplicate_dates
+            unrecognized_values = earlier['unrecognized_values'] + [
+                value for value in unrecognized_values if value not in earlier['unrecognized_values']]
+        rows, invalid_dates, duplicate_rows, empty_cells, unrecognized_cells = counts
+        return {
+            'rows': rows,
+            'days': len(days),
+            'first_date': str(days[0]) if len(days) else None,
+            'last_date': str(days[-1]) if len(days) else None,
+            'invalid_dates': invalid_dates,
+            'duplicate_rows': duplicate_rows,
+            'duplicate_dates': duplicate_dates[:REPORT_SAMPLES],
+            'missing_days': len(missing),
+            'missing_dates': _iso_days(missing[-REPORT_SAMPLES:]),
+            'empty_cells': empty_cells,
+            'unrecognized_cells': unrecognized_cells,
+            'unrecognized_values': unrecognized_values[:REPORT_SAMPLES]
+        }
+
+
+def to_calendar(encoded, start=None, end=None):
+    """
+    Reindex validated habits onto every day from ``start`` to ``end``.
+
+    Parameters:
+    -----------
+    encoded : EncodedHabits
+        Validated habits (sorted, one row per day)
+    start, end : numpy.datetime64, optional
+        First and last calendar day (default: the first and last logged day)
+
+    Returns:
+    --------
+    (numpy.ndarray, numpy.ndarray)
+        The datetime64[D] calendar days and a uint8 (days x habits) matrix of
+        MISSED, DONE or NOT_LOGGED states
+    """
+    days = np.asarray(encoded.dates, dtype='datetime64[D]')
+    n_habits = len(encoded.habits)
+    if start is None or end is None:
+        if not len(days):
+            return np.zeros(0, dtype='datetime64[D]'), np.zeros((0, n_habits), dtype=np.uint8)
+        start = days[0] if start is None else start
+        end = days[-1] if end is None else end
+    start, end = np.datetime64(start, 'D'), np.datetime64(end, 'D')
+    calendar = np.arange(start, end + 1, dtype='datetime64[D]')
+    states = np.full((len(calendar), n_habits), NOT_LOGGED, dtype=np.uint8)
+    in_range = (days >= start) & (days <= end)
+    states[(days[in_range] - start).astype(np.int64)] = np.asarray(encoded.matrix)[in_range]
+    return calendar, states
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# Add the project root to the path so the tests can import from src
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
@@ -0,0 +1,157 @@
+"""Bit-packed HabitMatrix and the HabitIndex range queries against the unpacked matrix."""
+import numpy as np
+import pandas as pd
+import pytest
+
+from benchmarks.synthetic import make_tracker
+from src.analyzer import (EncodedHabits, HabitMatrix, encode_habits, find_streak_runs, get_streak_stats,
+                          summarize_habits, get_detailed_stats)
+from src.query import HabitIndex, WEEKDAYS
+
+# Day counts around byte boundaries
+DAY_COUNTS = [1, 2, 7, 8, 9, 15, 16, 17, 63, 64, 65, 365]
+
+
+def make_encoded(days, pattern, habits=4, seed=0):
+    rng = np.random.default_rng(seed + days)
+    if pattern == 'random':
+        matrix = rng.random((days, habits)) < 0.6
+    elif pattern == 'ones':
+        matrix = np.ones((days, habits), dtype=bool)
+    elif pattern == 'zeros':
+        matrix = np.zeros((days, habits), dtype=bool)
+    else:  # Alternating days, offset per habit
+        matrix = (np.arange(days)[:, None] + np.arange(habits)) % 2 == 0
+    dates = pd.date_range('2025-01-01', periods=days).values
+    return EncodedHabits([f'Habit {i}' for i in range(habits)], dates, matrix.astype(np.uint8))
+
+
+@pytest.fixture(params=[(days, pattern) for days in DAY_COUNTS for pattern in ('random', 'ones', 'zeros', 'alternate')],
+                ids=lambda param: f'{param[0]}-{param[1]}')
+def encoded(request):
+    return make_encoded(*request.param)
+
+
+def test_bits_round_trip(encoded):
+    packed = HabitMatrix.from_encoded(encoded)
+    assert packed.bits.shape == (len(encoded.habits), -(-len(encoded.dates) // 8))
+    np.testing.assert_array_equal(packed.to_encoded().matrix, encoded.matrix)
+
+
+@pytest.mark.parametrize('later', [True, False])
+def test_shift(encoded, later):
+    packed = HabitMatrix.from_encoded(encoded)
+    shifted = np.unpackbits(packed._shift(packed.bits, later), axis=1)[:, :len(encoded.dates)].T
+    expected = np.zeros_like(encoded.matrix)
+    if later:
+        expected[1:] = encoded.matrix[:-1]
+    else:
+        expected[:-1] = encoded.matrix[1:]
+    # The padding bits past the last day may pick up a shifted-out bit; only real days count
+    np.testing.assert_array_equal(shifted, expected)
+
+
+def test_streak_runs(encoded):
+    actual = HabitMatrix.from_encoded(encoded).streak_runs()
+    expected = find_streak_runs(encoded.matrix)
+    for field in expected._fields:
+        np.testing.assert_array_equal(getattr(actual, field), getattr(expected, field))
+
+
+def test_streak_stats(encoded):
+    packed = HabitMatrix.from_encoded(encoded)
+    assert get_streak_stats(packed, include_runs=True) == get_streak_stats(encoded, include_runs=True)
+
+
+def test_counts_and_changes(encoded):
+    packed = HabitMatrix.from_encoded(encoded)
+    np.testing.assert_array_equal(packed.completion_counts(), encoded.matrix.sum(axis=0))
+    assert packed.completion_rates() == summarize_habits(None, encoded=encoded)
+    changes = (np.diff(encoded.matrix.astype(np.int8), axis=0) != 0).sum(axis=0) + 1
+    np.testing.assert_array_equal(packed.status_changes(), changes)
+
+
+@pytest.mark.parametrize('start, stop', [(0, None), (0, 1), (3, 11), (7, 9), (8, 16), (5, 1000), (20, 10)])
+def test_rows(encoded, start, stop):
+    rows = HabitMatrix.from_encoded(encoded).rows(start, stop)
+    stop = len(encoded.dates) if stop is None else min(stop, len(encoded.dates))
+    start = min(start, stop)
+    np.testing.assert_array_equal(rows.matrix, encoded.matrix[start:stop])
+    np.testing.assert_array_equal(rows.dates, np.asarray(encoded.dates[start:stop], dtype='datetime64[D]'))
+
+
+def test_frame_round_trip():
+    df = make_tracker(37, 5, missing_rate=0.2, irregular_rate=0.2)
+    packed = HabitMatrix.from_frame(df)
+    assert packed.valid is not None
+    frame = packed.to_frame()
+    # Empty cells stay empty and every value comes back as Yes/No
+    habits = list(frame.columns[1:])
+    np.testing.assert_array_equal(frame[habits].isna().to_numpy(), df[habits].isna().to_numpy())
+    np.testing.assert_array_equal(encode_habits(frame).matrix, encode_habits(df).matrix)
+
+
+def test_empty_matrix():
+    encoded = EncodedHabits(['Walk'], np.array([], dtype='datetime64[ns]'), np.zeros((0, 1), dtype=np.uint8))
+    packed = HabitMatrix.from_encoded(encoded)
+    assert packed.completion_rates() == {}
+    assert len(packed.streak_runs().habit) == 0
+
+
+@pytest.fixture(scope='module')
+def tracker():
+    # Two skipped days, so calendar slots and logged rows differ
+    df = make_tracker(120, 4, irregular_rate=0.1).drop(index=[10, 50]).reset_index(drop=True)
+    return df, encode_habits(df)
+
+
+@pytest.mark.parametrize('start, end', [(None, None), ('2015-01-05', '2015-02-14'), ('2015-01-12', '2015-01-12'),
+                                        (None, '2015-03-01'), ('2015-02-20', None), ('2014-06-01', '2016-01-01')])
+def test_index_matches_rows_in_range(tracker, start, end):
+    df, encoded = tracker
+    index = HabitIndex(encoded)
+    dates = pd.to_datetime(df['Date'])
+    in_range = df[(dates >= (start or dates.min())) & (dates <= (end or dates.max()))]
+
+    assert index.completion_rates(start, end) == summarize_habits(in_range)
+    rows = index.rows(start, end)
+    np.testing.assert_array_equal(rows.matrix, encode_habits(in_range).matrix)
+    assert get_detailed_stats(None, encoded=rows) == get_detailed_stats(in_range)
+
+    # Weekday rates: completions over logged days per day of the week
+    weekday = pd.to_datetime(in_range['Date']).dt.dayofweek.to_numpy()
+    in_range_encoded = encode_habits(in_range)
+    rates = index.weekday_rates(start, end)
+    for habit_i, habit in enumerate(encoded.habits):
+        for day in range(7):
+            logged = weekday == day
+            expected = round(in_range_encoded.matrix[logged, habit_i].mean() * 100, 2) if logged.any() else None
+            assert rates[habit][WEEKDAYS[day]] == expected
+
+
+def test_index_rolling(tracker):
+    df, encoded = tracker
+    index = HabitIndex(encoded)
+    last = pd.to_datetime(df['Date']).max()
+    for window in (7, 30):
+        start = (last - pd.Timedelta(days=window - 1)).strftime('%Y-%m-%d')
+        assert index.rolling_rates(window) == index.completion_rates(start, None)
+    series = index.rolling_series(7)
+    assert series.shape == (index.n_days, len(encoded.habits))
+    np.testing.assert_allclose(series[-1], list(index.rolling_rates(7).values()), atol=0.005)
+
+
+def test_index_empty_range(tracker):
+    _, encoded = tracker
+    index = HabitIndex(encoded)
+    assert index.rows('2030-01-01', None) is None
+    assert index.completion_rates('2030-01-01', None) == {}
+    assert index.weekday_rates('2015-02-10', '2015-02-01') == {}
+
+
+def test_index_size(tracker):
+    _, encoded = tracker
+    index = HabitIndex(encoded)
+    # 118 rows fit uint8 counts
+    assert index._done.dtype == np.uint8
+    assert index.nbytes < 2 * (index.n_days + 1) * len(encoded.habits) + 4096
@@ -0,0 +1,21 @@
+"""Every chart renders, also for sheets with nothing to plot."""
+import os
+
+import pandas as pd
+import pytest
+
+from src.rendering import chart_types, render_charts
+from src.analyzer import encode_habits
+
+
+@pytest.mark.parametrize('df', [
+    pd.DataFrame({'Date': ['2025-01-01', '2025-01-02'], 'Notes': ['a', 'b']}),
+    pd.DataFrame({'Date': ['2025-01-01', '2025-01-02']}),
+    pd.DataFrame({'Date': ['someday'], 'Walk': ['Yes']}),
+], ids=['notes-only', 'date-only', 'no-valid-days'])
+def test_charts_without_habits_or_days(df, tmp_path):
+    jobs = [(chart_type, str(tmp_path / f'{chart_type}.png')) for chart_type in chart_types()]
+    results = render_charts(encode_habits(df), jobs, max_workers=1)
+    assert [result.chart_type for result in results] == chart_types()
+    for _, path in jobs:
+        assert os.path.getsize(path) > 0
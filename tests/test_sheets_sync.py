@@ -0,0 +1,219 @@
+"""Offline tests of the delta sync against CsvWorksheet."""
+import csv
+import json
+
+import pandas as pd
+import pytest
+
+from src.sheets_sync import sync_worksheet, sync_meta_path, column_letter, CsvWorksheet, DEFAULT_OVERLAP
+
+HEADER = ['Date', 'Walk', 'Read', 'Notes']
+
+
+def make_rows(days, start='2025-01-01'):
+    dates = pd.date_range(start, periods=days).strftime('%Y-%m-%d')
+    return [[date, 'Yes' if i % 3 else 'No', 'Yes' if i % 2 else 'No', f'day {i}'] for i, date in enumerate(dates)]
+
+
+def write_sheet(path, rows, header=HEADER):
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        csv.writer(f).writerows([header] + rows)
+
+
+@pytest.fixture
+def sheet(tmp_path):
+    path = tmp_path / 'sheet.csv'
+    rows = make_rows(30)
+    write_sheet(path, rows)
+    return path, rows
+
+
+@pytest.fixture
+def csv_path(tmp_path):
+    return str(tmp_path / 'habit_data.csv')
+
+
+class RecordingWorksheet(CsvWorksheet):
+    """CsvWorksheet that remembers the ranges and full reads the sync asked for."""
+
+    def __init__(self, path):
+        super().__init__(path)
+        self.ranges = []
+        self.full_reads = 0
+
+    def get_all_values(self):
+        self.full_reads += 1
+        return super().get_all_values()
+
+    def batch_get(self, ranges):
+        self.ranges.append(list(ranges))
+        return super().batch_get(ranges)
+
+
+def stored(csv_path):
+    return pd.read_csv(csv_path, keep_default_na=False).astype(str).values.tolist()
+
+
+def test_column_letter():
+    assert [column_letter(i) for i in (1, 4, 26, 27, 52, 703)] == ['A', 'D', 'Z', 'AA', 'AZ', 'AAA']
+
+
+def test_batch_get_ranges(sheet):
+    path, rows = sheet
+    header, tail = CsvWorksheet(path).batch_get(['A1:D1', 'A5:B'])
+    assert header == [HEADER]
+    assert tail == [row[:2] for row in rows[3:]]
+    with pytest.raises(ValueError):
+        CsvWorksheet(path).batch_get(['Sheet1!A:A'])
+
+
+def test_first_sync_is_full(sheet, csv_path):
+    path, rows = sheet
+    result = sync_worksheet(CsvWorksheet(path), csv_path)
+    assert result.mode == 'full'
+    assert result.sheet_rows == len(rows)
+    assert stored(csv_path) == rows
+
+
+def test_unchanged_sheet(sheet, csv_path):
+    path, rows = sheet
+    sync_worksheet(CsvWorksheet(path), csv_path)
+    result = sync_worksheet(CsvWorksheet(path), csv_path)
+    assert result.mode == 'unchanged'
+    assert result.new_rows.empty
+    assert stored(csv_path) == rows
+
+
+def test_new_rows_are_appended(sheet, csv_path):
+    path, rows = sheet
+    sync_worksheet(CsvWorksheet(path), csv_path)
+    rows = make_rows(35)
+    write_sheet(path, rows)
+
+    result = sync_worksheet(CsvWorksheet(path), csv_path)
+    assert result.mode == 'delta'
+    assert result.new_rows.values.tolist() == rows[30:]
+    assert result.sheet_rows == 35
+    assert stored(csv_path) == rows
+
+    # The appended rows are part of the checksum of the next sync
+    assert sync_worksheet(CsvWorksheet(path), csv_path).mode == 'unchanged'
+
+
+def test_delta_reads_only_the_overlap_and_new_rows(sheet, csv_path):
+    path, _ = sheet
+    sync_worksheet(CsvWorksheet(path), csv_path)
+    write_sheet(path, make_rows(35))
+
+    worksheet = RecordingWorksheet(path)
+    sync_worksheet(worksheet, csv_path)
+    # Row 1 is the header and rows 2-31 the 30 synced rows: the read starts
+    # at the first unsynced row (32) minus the overlap, not at A2
+    assert worksheet.ranges == [['A1:E1', f'A{32 - DEFAULT_OVERLAP}:D']]
+    assert worksheet.full_reads == 0
+
+    worksheet = RecordingWorksheet(path)
+    assert sync_worksheet(worksheet, csv_path).mode == 'unchanged'
+    assert worksheet.ranges == [['A1:E1', f'A{37 - DEFAULT_OVERLAP}:D']]
+
+
+def test_short_sheet_overlaps_every_row(tmp_path, csv_path):
+    path = tmp_path / 'sheet.csv'
+    write_sheet(path, make_rows(3))
+    sync_worksheet(CsvWorksheet(path), csv_path)
+    write_sheet(path, make_rows(4))
+
+    worksheet = RecordingWorksheet(path)
+    assert sync_worksheet(worksheet, csv_path).mode == 'delta'
+    assert worksheet.ranges == [['A1:E1', 'A2:D']]
+    assert stored(csv_path) == make_rows(4)
+
+
+@pytest.mark.parametrize('row', [30 - DEFAULT_OVERLAP, 28, 29])
+def test_edited_row_triggers_full_resync(sheet, csv_path, row):
+    path, rows = sheet
+    sync_worksheet(CsvWorksheet(path), csv_path)
+    rows[row][1] = 'No' if rows[row][1] == 'Yes' else 'Yes'
+    write_sheet(path, rows + make_rows(2, start='2025-01-31'))
+
+    worksheet = RecordingWorksheet(path)
+    result = sync_worksheet(worksheet, csv_path)
+    assert result.mode == 'full'
+    assert worksheet.full_reads == 1
+    assert stored(csv_path) == rows + make_rows(2, start='2025-01-31')
+
+
+def test_edit_above_overlap_needs_forced_resync(sheet, csv_path):
+    path, rows = sheet
+    sync_worksheet(CsvWorksheet(path), csv_path)
+    original = [list(row) for row in rows]
+    rows[4][1] = 'No' if rows[4][1] == 'Yes' else 'Yes'
+    write_sheet(path, rows)
+
+    # Only the overlap window is checksummed, so the edit is not read...
+    assert sync_worksheet(CsvWorksheet(path), csv_path).mode == 'unchanged'
+    assert stored(csv_path) == original
+    # ...until a full resync
+    assert sync_worksheet(CsvWorksheet(path), csv_path, full=True).mode == 'full'
+    assert stored(csv_path) == rows
+
+
+def test_removed_row_triggers_full_resync(sheet, csv_path):
+    path, rows = sheet
+    sync_worksheet(CsvWorksheet(path), csv_path)
+    del rows[10]
+    write_sheet(path, rows)
+
+    result = sync_worksheet(CsvWorksheet(path), csv_path)
+    assert result.mode == 'full'
+    assert stored(csv_path) == rows
+
+
+def test_new_column_triggers_full_resync(sheet, csv_path):
+    path, rows = sheet
+    sync_worksheet(CsvWorksheet(path), csv_path)
+    header = HEADER[:3] + ['Yoga'] + HEADER[3:]
+    rows = [row[:3] + ['Yes'] + row[3:] for row in rows]
+    write_sheet(path, rows, header)
+
+    result = sync_worksheet(CsvWorksheet(path), csv_path)
+    assert result.mode == 'full'
+    assert list(pd.read_csv(csv_path).columns) == header
+    assert stored(csv_path) == rows
+
+
+def test_appended_column_triggers_full_resync(sheet, csv_path):
+    path, rows = sheet
+    sync_worksheet(CsvWorksheet(path), csv_path)
+    rows = [row + ['Yes'] for row in rows]
+    write_sheet(path, rows, HEADER + ['Yoga'])
+
+    assert sync_worksheet(CsvWorksheet(path), csv_path).mode == 'full'
+    assert list(pd.read_csv(csv_path).columns) == HEADER + ['Yoga']
+
+
+def test_forced_full_resync(sheet, csv_path):
+    path, _ = sheet
+    sync_worksheet(CsvWorksheet(path), csv_path)
+    assert sync_worksheet(CsvWorksheet(path), csv_path, full=True).mode == 'full'
+
+
+def test_outdated_meta_triggers_full_resync(sheet, csv_path):
+    path, _ = sheet
+    sync_worksheet(CsvWorksheet(path), csv_path)
+    with open(sync_meta_path(csv_path), 'w', encoding='utf-8') as f:
+        json.dump({'version': 0}, f)
+    assert sync_worksheet(CsvWorksheet(path), csv_path).mode == 'full'
+
+
+def test_dates_are_normalized_and_sorted(tmp_path, csv_path):
+    path = tmp_path / 'sheet.csv'
+    write_sheet(path, [
+        ['1/3/2025', 'Yes', 'No', ''],
+        ['2025-01-01', 'No', 'Yes', ''],
+        ['', '', '', ''],
+        ['someday', 'Yes', 'Yes', 'unreadable date'],
+    ])
+    sync_worksheet(CsvWorksheet(path), csv_path)
+    # Blank rows are dropped; unreadable dates are kept for validation to report
+    assert sorted(pd.read_csv(csv_path)['Date']) == ['2025-01-01', '2025-01-03', 'someday']
@@ -0,0 +1,121 @@
+"""HabitStatsState folded in batches must match get_detailed_stats() over the whole history."""
+import json
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from benchmarks.synthetic import make_tracker
+from src.analyzer import encode_habits, get_detailed_stats, HabitStatsState, EncodedHabits
+
+
+def batches(encoded, sizes):
+    """Split ``encoded`` into consecutive batches, cycling through ``sizes``."""
+    start, i = 0, 0
+    while start < len(encoded.dates):
+        stop = start + sizes[i % len(sizes)]
+        yield EncodedHabits(encoded.habits, encoded.dates[start:stop], encoded.matrix[start:stop])
+        start, i = stop, i + 1
+
+
+def fold(encoded, sizes):
+    state = HabitStatsState(encoded.habits)
+    for batch in batches(encoded, sizes):
+        state.update_encoded(batch)
+    return state
+
+
+@pytest.fixture(scope='module')
+def encoded():
+    return encode_habits(make_tracker(100, 5, missing_rate=0.1, irregular_rate=0.1))
+
+
+@pytest.mark.parametrize('sizes', [[1], [3], [7], [8], [13, 1, 6], [100]])
+def test_batches_match_detailed_stats(encoded, sizes):
+    state = fold(encoded, sizes)
+    assert state.n_days == len(encoded.dates)
+    assert state.detailed_stats() == get_detailed_stats(None, encoded=encoded)
+
+
+@pytest.mark.parametrize('days', [1, 4, 5, 6, 9, 15])
+def test_short_histories(days):
+    # Weeks with fewer than MIN_WEEK_DAYS days and histories shorter than a week
+    encoded = encode_habits(make_tracker(days, 3, seed=days))
+    assert fold(encoded, [2]).detailed_stats() == get_detailed_stats(None, encoded=encoded)
+
+
+def test_streaks_across_batches():
+    habits = ['Walk', 'Read']
+    dates = pd.date_range('2025-01-01', periods=10).values
+    matrix = np.array([[1, 0], [1, 1], [1, 1], [0, 1], [1, 0],
+                       [1, 1], [1, 1], [1, 0], [1, 1], [1, 1]], dtype=np.uint8)
+    encoded = EncodedHabits(habits, dates, matrix)
+    for sizes in ([1], [2], [4, 1], [10]):
+        streaks = fold(encoded, sizes).detailed_stats()['streaks']
+        assert streaks == {'Walk': {'current_streak': 6, 'longest_streak': 6},
+                           'Read': {'current_streak': 2, 'longest_streak': 3}}
+
+
+def test_mean_and_variance(encoded):
+    state = fold(encoded, [7, 2])
+    values = encoded.matrix.astype(float)
+    np.testing.assert_allclose(state.mean, values.mean(axis=0))
+    np.testing.assert_allclose(state.variance, values.var(axis=0, ddof=1))
+    assert np.isnan(HabitStatsState(encoded.habits).variance).all()
+
+
+def test_update_from_records():
+    df = make_tracker(40, 3, irregular_rate=0.2)
+    state = HabitStatsState([col for col in df.columns if col not in ('Date', 'Notes')])
+    assert state.update(df.iloc[:25].to_dict('records')) == 25
+    assert state.update(df.iloc[25:]) == 15
+    assert state.detailed_stats() == get_detailed_stats(df)
+
+
+def test_folded_days_are_skipped(encoded):
+    state = fold(encoded, [30])
+    before = state.to_dict()
+    # The whole sheet again, or an earlier day logged again, adds nothing
+    assert state.update_encoded(encoded) == 0
+    assert state.update_encoded(EncodedHabits(encoded.habits, encoded.dates[10:11], 1 - encoded.matrix[10:11])) == 0
+    assert state.to_dict() == before
+
+
+def test_partially_folded_batch(encoded):
+    state = fold(EncodedHabits(encoded.habits, encoded.dates[:60], encoded.matrix[:60]), [60])
+    # Only the days after the last folded one are taken from an overlapping batch
+    assert state.update_encoded(EncodedHabits(encoded.habits, encoded.dates[50:], encoded.matrix[50:])) == 40
+    assert state.detailed_stats() == get_detailed_stats(None, encoded=encoded)
+
+
+def test_mismatched_habits(encoded):
+    state = HabitStatsState(encoded.habits[::-1])
+    with pytest.raises(ValueError):
+        state.update_encoded(encoded)
+    with pytest.raises(ValueError):
+        state.update(pd.DataFrame({'Date': ['2025-01-01']}))
+
+
+@pytest.mark.parametrize('split', [0, 3, 50, 100])
+def test_round_trip(encoded, split, tmp_path):
+    first = EncodedHabits(encoded.habits, encoded.dates[:split], encoded.matrix[:split])
+    rest = EncodedHabits(encoded.habits, encoded.dates[split:], encoded.matrix[split:])
+    state = fold(first, [8]) if split else HabitStatsState(encoded.habits)
+
+    # Through JSON, as the generator stores it between runs
+    restored = HabitStatsState.from_dict(json.loads(json.dumps(state.to_dict())))
+    assert restored.to_dict() == state.to_dict()
+    path = str(tmp_path / 'state.json')
+    state.save(path)
+    assert HabitStatsState.load(path).to_dict() == state.to_dict()
+
+    for batch in batches(rest, [5]):
+        restored.update_encoded(batch)
+    assert restored.detailed_stats() == get_detailed_stats(None, encoded=encoded)
+
+
+def test_old_state_version_is_rejected(encoded):
+    state = fold(encoded, [10]).to_dict()
+    state['version'] = HabitStatsState.VERSION - 1
+    with pytest.raises(ValueError):
+        HabitStatsState.from_dict(state)
@@ -0,0 +1,177 @@
+"""stream_csv() and the habit store must match encode_habits() on the whole sheet, whatever the chunk size."""
+import json
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from benchmarks.synthetic import make_tracker
+from src.analyzer import (encode_habits, stream_csv, stream_store, write_store, append_store, load_store, load_store_notes,
+                          read_store_meta, store_to_frame, get_detailed_stats, HabitStatsState)
+from src.validation import ValidationReport
+
+CHUNK_SIZES = [1, 2, 7, 8, 25, None]
+
+
+def messy_tracker(days=60, habits=4, seed=0):
+    """A sheet typed by hand: rows out of order, days logged twice or skipped, a bad date."""
+    df = make_tracker(days, habits, missing_rate=0.1, irregular_rate=0.2, seed=seed)
+    df['Notes'] = [f'note {i}' for i in range(days)]
+    rng = np.random.default_rng(seed)
+    again = df.iloc[rng.choice(days, size=5, replace=False)].copy()
+    again['Notes'] = [f'again {i}' for i in range(len(again))]
+    again[df.columns[1]] = 'Yes'
+    bad = df.iloc[:1].assign(Date='not a date', Notes='bad date')
+    df = pd.concat([df.drop(index=[3, 17]), again, bad], ignore_index=True)
+    return df.iloc[rng.permutation(len(df))].reset_index(drop=True)
+
+
+def expected(df):
+    report = ValidationReport()
+    encoded = encode_habits(df, report)
+    return encoded, report.to_dict(encoded.dates)
+
+
+def assert_same_habits(actual, reference):
+    assert list(actual.habits) == list(reference.habits)
+    np.testing.assert_array_equal(np.asarray(actual.dates, dtype='datetime64[D]'),
+                                  np.asarray(reference.dates, dtype='datetime64[D]'))
+    np.testing.assert_array_equal(actual.matrix, reference.matrix)
+
+
+@pytest.fixture(params=['sorted', 'messy'])
+def sheet(request, tmp_path):
+    df = make_tracker(50, 3, irregular_rate=0.1) if request.param == 'sorted' else messy_tracker()
+    path = str(tmp_path / 'habit_data.csv')
+    df.to_csv(path, index=False)
+    return path, pd.read_csv(path)
+
+
+@pytest.mark.parametrize('chunksize', CHUNK_SIZES)
+def test_matches_encode_habits(sheet, chunksize):
+    path, df = sheet
+    encoded, validation = expected(df)
+    streamed = stream_csv(path, chunksize=chunksize)
+    assert streamed.columns == list(df.columns)
+    assert_same_habits(streamed.encoded, encoded)
+    assert streamed.validation == validation
+    assert streamed.state is None
+
+
+@pytest.mark.parametrize('chunksize', CHUNK_SIZES)
+def test_state_matches_detailed_stats(sheet, chunksize):
+    path, df = sheet
+    encoded, _ = expected(df)
+    state = stream_csv(path, chunksize=chunksize, build_state=True).state
+    reference = HabitStatsState(encoded.habits)
+    reference.update_encoded(encoded)
+    assert state.n_days == len(encoded.dates)
+    assert state.detailed_stats() == get_detailed_stats(None, encoded=encoded)
+    assert state.to_dict()['completions'] == reference.to_dict()['completions']
+
+
+@pytest.mark.parametrize('chunksize', CHUNK_SIZES)
+def test_notes_follow_rows(sheet, chunksize, tmp_path):
+    path, df = sheet
+    notes_path = str(tmp_path / 'notes.json')
+    streamed = stream_csv(path, chunksize=chunksize, notes_path=notes_path)
+    with open(notes_path, 'r', encoding='utf-8') as f:
+        notes = json.load(f)
+
+    # The last row of every valid date, in date order
+    dates = pd.to_datetime(df['Date'], errors='coerce')
+    last_rows = df[dates.notna()].assign(day=dates).sort_values('day', kind='stable').groupby('day').tail(1)
+    assert notes == last_rows['Notes'].fillna('').astype(str).tolist()
+    assert len(notes) == len(streamed.encoded.dates)
+
+
+def test_relogged_day_keeps_last_row(tmp_path):
+    path = str(tmp_path / 'habit_data.csv')
+    pd.DataFrame({
+        'Date': ['2025-01-01', '2025-01-02', '2025-01-03', '2025-01-02', '2025-01-04'],
+        'Walk': ['No', 'No', 'Yes', 'Yes', 'No'],
+        'Notes': ['a', 'b', 'c', 'b fixed', 'd']
+    }).to_csv(path, index=False)
+    for chunksize in (1, 2, 3, None):
+        streamed = stream_csv(path, chunksize=chunksize, notes_path=str(tmp_path / 'notes.json'), build_state=True)
+        assert streamed.encoded.matrix[:, 0].tolist() == [0, 1, 1, 0]
+        assert streamed.validation['duplicate_rows'] == 1
+        assert streamed.state.detailed_stats()['streaks']['Walk'] == {'current_streak': 0, 'longest_streak': 2}
+        with open(tmp_path / 'notes.json', 'r', encoding='utf-8') as f:
+            assert json.load(f) == ['a', 'b fixed', 'c', 'd']
+
+
+def test_header_only(tmp_path):
+    path = str(tmp_path / 'habit_data.csv')
+    pd.DataFrame(columns=['Date', 'Walk', 'Notes']).to_csv(path, index=False)
+    streamed = stream_csv(path, build_state=True)
+    assert streamed.encoded.matrix.shape == (0, 1)
+    assert streamed.state.n_days == 0
+    assert streamed.validation['days'] == 0
+
+
+@pytest.mark.parametrize('chunksize', [3, None])
+def test_stream_store_matches_write_store(sheet, chunksize, tmp_path):
+    path, df = sheet
+    written = write_store(df, str(tmp_path / 'written'))
+    streamed_meta, streamed = stream_store(path, str(tmp_path / 'streamed'), chunksize=chunksize)
+
+    assert_same_habits(load_store(str(tmp_path / 'streamed')), load_store(str(tmp_path / 'written')))
+    assert load_store_notes(str(tmp_path / 'streamed')) == load_store_notes(str(tmp_path / 'written'))
+    for key in ('habits', 'columns', 'schema', 'rows', 'validation'):
+        assert streamed_meta[key] == written[key]
+    assert streamed_meta['schema'][df.columns[1]] == 'bool'
+
+
+def test_store_generations(sheet, tmp_path):
+    path, df = sheet
+    store_dir = str(tmp_path / 'store')
+    stream_store(path, store_dir)
+    stream_store(path, store_dir, chunksize=4)
+    meta = read_store_meta(store_dir)
+    assert meta['generation'] == 2
+    # Only the current generation's files are left
+    assert sorted(p.name for p in (tmp_path / 'store').iterdir()) == sorted(['meta.json'] + list(meta['files'].values()))
+
+    frame = store_to_frame(store_dir)
+    assert_same_habits(encode_habits(frame), expected(df)[0])
+
+
+@pytest.mark.parametrize('split', [0, 1, 20, 44])
+def test_append_store_matches_stream_store(split, tmp_path):
+    df = make_tracker(50, 3, missing_rate=0.1, irregular_rate=0.2)
+    df['Notes'] = [f'note {i}' for i in range(len(df))]
+    path = str(tmp_path / 'habit_data.csv')
+    df.to_csv(path, index=False)
+    df = pd.read_csv(path, dtype=str)
+    store_dir = str(tmp_path / 'appended')
+    write_store(df.iloc[:split], store_dir)
+    # Two appends, the second with a day logged twice
+    append_store(store_dir, df.iloc[split:45])
+    meta, encoded = append_store(store_dir, pd.concat([df.iloc[45:], df.iloc[-1:]]))
+
+    expected_meta, streamed = stream_store(path, str(tmp_path / 'streamed'))
+    assert_same_habits(encoded, streamed.encoded)
+    assert_same_habits(load_store(store_dir), streamed.encoded)
+    assert load_store_notes(store_dir) == load_store_notes(str(tmp_path / 'streamed'))
+    for key in ('habits', 'columns', 'schema', 'rows'):
+        assert meta[key] == expected_meta[key]
+    validation = dict(expected_meta['validation'], rows=51, duplicate_rows=1, duplicate_dates=['2015-02-19'])
+    assert {key: value for key, value in meta['validation'].items() if key != 'unrecognized_values'} == \
+        {key: value for key, value in validation.items() if key != 'unrecognized_values'}
+    assert sorted(meta['validation']['unrecognized_values']) == sorted(validation['unrecognized_values'])
+    assert meta['generation'] == 3
+
+
+def test_append_store_rejects_earlier_days_and_new_columns(tmp_path):
+    df = make_tracker(20, 3)
+    store_dir = str(tmp_path / 'store')
+    write_store(df.iloc[:10], store_dir)
+    with pytest.raises(ValueError):
+        append_store(store_dir, df.iloc[9:])
+    with pytest.raises(ValueError):
+        append_store(store_dir, df.iloc[10:].assign(Yoga='Yes'))
+    with pytest.raises(ValueError):
+        append_store(str(tmp_path / 'missing'), df)
+    # The store is left as it was
+    assert read_store_meta(store_dir)['rows'] == 10